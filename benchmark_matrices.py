@@ -0,0 +1,264 @@
+# Benchmark y pruebas de regresión del procesamiento de matrices
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+RUTA_MODULO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "matrices_datos_y_estados - 3.py")
+
+# Barridos por defecto (rápido) y completo
+N_RAPIDO = [10 ** 2, 10 ** 3, 10 ** 4, 10 ** 5]
+M_RAPIDO = [2, 4, 8, 10]
+N_COMPLETO = [10 ** k for k in range(2, 8)]
+M_COMPLETO = [2, 4, 6, 8, 10, 12, 14, 16, 18, 20]
+
+# Límites para la verificación contra la implementación de referencia (bucle en Python)
+N_MAX_REFERENCIA = 2000
+M_MAX_REFERENCIA = 8
+M_MAX_MARGINALES = 6
+
+def cargar_modulo():
+    """
+    Importa el módulo principal a partir de su ruta (su nombre de archivo tiene espacios).
+
+    El módulo se registra en sys.modules para que los procesos de procesar_en_paralelo puedan
+    importar sus funciones.
+    """
+    if "matrices_datos_y_estados" in sys.modules:
+        return sys.modules["matrices_datos_y_estados"]
+    spec = importlib.util.spec_from_file_location("matrices_datos_y_estados", RUTA_MODULO)
+    modulo = importlib.util.module_from_spec(spec)
+    sys.modules["matrices_datos_y_estados"] = modulo
+    spec.loader.exec_module(modulo)
+    return modulo
+
+def generar_muestras(n, m, semilla):
+    """
+    Genera muestras aleatorias reproducibles de forma (n, m) y tipo uint8.
+    """
+    return np.random.default_rng(semilla).integers(0, 2, size=(n, m), dtype=np.uint8)
+
+def memoria_rss_mb():
+    """
+    Devuelve el pico de memoria residente del proceso en MB (None si no se puede medir).
+    """
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico / 1024 ** 2 if sys.platform == "darwin" else pico / 1024
+
+def medir(funcion, repeticiones):
+    """
+    Mide el mejor tiempo de varias ejecuciones y el pico de memoria asignada (con tracemalloc).
+
+    Returns:
+        tuple: (resultado, segundos, pico_mb)
+    """
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        mejor = min(mejor, time.perf_counter() - inicio)
+        del resultado
+
+    # La memoria se mide en una ejecución aparte porque tracemalloc hace más lento el código
+    tracemalloc.start()
+    resultado = funcion()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return resultado, mejor, pico / 1024 ** 2
+
+def etapas(modulo, n, m, muestras):
+    """
+    Devuelve las etapas a medir como pares (nombre, función sin argumentos).
+
+    Las etapas de marginalización usan la matriz EstadoEstadoF calculada por la primera etapa.
+    """
+    dispersa = m >= modulo.M_DISPERSA
+    matrices = {}
+
+    def procesar():
+        matrices["resultado"] = modulo.procesamiento_datos(n, m, muestras, dispersa=dispersa)
+        return matrices["resultado"]
+
+    def estado_f():
+        return matrices["resultado"][1]
+
+    return [
+        ("procesamiento_datos", procesar),
+        ("marginalizar", lambda: modulo.marginalizar(estado_f(), [0, 1])),
+        ("normalizar", lambda: modulo.normalizar(estado_f())),
+        ("marginalizar_y_normalizar", lambda: modulo.marginalizar_y_normalizar(estado_f(), [1, 2], [1, 2])),
+        ("marginalizar_canales", lambda: modulo.marginalizar_canales(estado_f(), [0, 1], [0, 1])),
+        # Todas las marginales de los primeros canales (hasta 4), calculadas en lote
+        ("red_marginales", lambda: modulo.RedMarginales(estado_f()).calcular(modulo.familia_subconjuntos(min(m, 4)))),
+    ]
+
+def _densa(matriz):
+    return matriz.toarray() if hasattr(matriz, "toarray") else np.asarray(matriz)
+
+def marginal_directa(matriz, m, canales_presente, canales_futuro):
+    """
+    Marginal de una matriz densa de 2^m x 2^m calculada celda a celda, para verificar marginalizar_canales.
+    """
+    def indice(estado, canales):
+        return sum(((estado >> (m - 1 - canal)) & 1) << (len(canales) - 1 - k) for k, canal in enumerate(canales))
+
+    marginal = np.zeros((2 ** len(canales_presente), 2 ** len(canales_futuro)))
+    for fila in range(2 ** m):
+        for columna in range(2 ** m):
+            marginal[indice(fila, canales_presente), indice(columna, canales_futuro)] += matriz[fila, columna]
+    return marginal / 2 ** (m - len(canales_presente))
+
+def verificar(modulo, n, m, muestras):
+    """
+    Compara las rutas optimizadas con la implementación de referencia sobre las mismas muestras.
+
+    Returns:
+        list: Descripción de cada diferencia encontrada (vacía si todo coincide).
+    """
+    errores = []
+    referencia = modulo.procesamiento_datos_referencia(n, m, muestras.tolist())[:6]
+    candidatos = {
+        "procesamiento_datos": modulo.procesamiento_datos(n, m, muestras)[:6],
+        "procesamiento_datos (dispersa)": modulo.procesamiento_datos(n, m, muestras, dispersa=True)[:6],
+        "procesamiento_datos_por_bloques": modulo.procesamiento_datos_por_bloques(
+            muestras[inicio:inicio + 97] for inicio in range(0, n, 97)
+        )[:6],
+        "ModeloTransiciones": modulo.ModeloTransiciones(m).actualizar(muestras).matrices(),
+    }
+    for nombre, matrices in candidatos.items():
+        for nombre_matriz, esperada, obtenida in zip(modulo.NOMBRES_MATRICES, referencia, matrices):
+            if not np.allclose(esperada, _densa(obtenida), rtol=0, atol=1e-12):
+                errores.append(f"{nombre}: {nombre_matriz} difiere de la referencia (n={n}, m={m})")
+
+    estado_f = referencia[1]
+    marginal = modulo.marginalizar_y_normalizar(estado_f, [1, 2], [1, 2])
+    marginal_dispersa = modulo.marginalizar_y_normalizar(candidatos["procesamiento_datos (dispersa)"][1], [1, 2], [1, 2])
+    if not np.allclose(marginal, _densa(marginal_dispersa), rtol=0, atol=1e-12):
+        errores.append(f"marginalizar_y_normalizar (dispersa) difiere de la versión densa (n={n}, m={m})")
+
+    # Marginales por subconjuntos de canales (también en otro orden) contra el cálculo celda a celda
+    if m <= M_MAX_MARGINALES:
+        familia = list(modulo.familia_subconjuntos(min(m, 3)))
+        familia.append((tuple(range(m))[::-1], (m - 1, 0)))
+        redes = {
+            "RedMarginales": modulo.RedMarginales(estado_f),
+            "RedMarginales (dispersa)": modulo.RedMarginales(candidatos["procesamiento_datos (dispersa)"][1]),
+        }
+        calculadas = {nombre: red.calcular(familia, normalizada=False) for nombre, red in redes.items()}
+        for presente, futuro in familia:
+            esperada = marginal_directa(estado_f, m, presente, futuro)
+            obtenidas = {nombre: resultados[presente, futuro] for nombre, resultados in calculadas.items()}
+            obtenidas["marginalizar_canales"] = modulo.marginalizar_canales(estado_f, presente, futuro)
+            for nombre, obtenida in obtenidas.items():
+                if not np.allclose(esperada, _densa(obtenida), rtol=0, atol=1e-12):
+                    errores.append(f"{nombre}: la marginal P{presente} F{futuro} difiere del cálculo directo (n={n}, m={m})")
+    return errores
+
+def ejecutar(valores_n, valores_m, repeticiones, semilla, max_celdas):
+    """
+    Recorre el barrido de n y m midiendo cada etapa.
+
+    Returns:
+        dict: Resultados con el tiempo y la memoria de cada etapa, y los errores de verificación.
+    """
+    modulo = cargar_modulo()
+    resultados = {
+        "plataforma": platform.platform(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "semilla": semilla,
+        "mediciones": [],
+        "errores": [],
+    }
+    for m in valores_m:
+        for n in valores_n:
+            # Se omiten las combinaciones cuyo resultado denso no cabría en memoria
+            if m < modulo.M_DISPERSA and 6 * 4 ** m > max_celdas:
+                continue
+            if n * m * (m + 1) > 4 * max_celdas:
+                continue
+            muestras = generar_muestras(n, m, semilla)
+
+            if n <= N_MAX_REFERENCIA and m <= M_MAX_REFERENCIA:
+                resultados["errores"] += verificar(modulo, n, m, muestras)
+
+            for nombre, funcion in etapas(modulo, n, m, muestras):
+                _, segundos, pico_mb = medir(funcion, repeticiones)
+                resultados["mediciones"].append({
+                    "etapa": nombre, "n": n, "m": m,
+                    "segundos": segundos, "pico_mb": pico_mb,
+                    "muestras_por_segundo": n / segundos if segundos else None,
+                })
+                print(f"{nombre:28s} n={n:>9d} m={m:>2d}  {segundos * 1000:10.2f} ms  {pico_mb:10.2f} MB", flush=True)
+    resultados["rss_max_mb"] = memoria_rss_mb()
+    return resultados
+
+def comparar(resultados, linea_base, umbral, minimo_segundos):
+    """
+    Compara los tiempos con una línea base guardada.
+
+    Una etapa se considera regresión si tarda más que (1 + umbral) veces lo registrado y además la
+    diferencia supera minimo_segundos, para no fallar por ruido en mediciones muy cortas.
+
+    Returns:
+        list: Descripción de cada regresión encontrada.
+    """
+    base = {(medicion["etapa"], medicion["n"], medicion["m"]): medicion for medicion in linea_base["mediciones"]}
+    regresiones = []
+    for medicion in resultados["mediciones"]:
+        anterior = base.get((medicion["etapa"], medicion["n"], medicion["m"]))
+        if anterior is None:
+            continue
+        limite = anterior["segundos"] * (1 + umbral)
+        if medicion["segundos"] > limite and medicion["segundos"] - anterior["segundos"] > minimo_segundos:
+            regresiones.append(
+                f"{medicion['etapa']} n={medicion['n']} m={medicion['m']}: "
+                f"{medicion['segundos'] * 1000:.2f} ms (línea base {anterior['segundos'] * 1000:.2f} ms)"
+            )
+    return regresiones
+
+def main(argumentos=None):
+    parser = argparse.ArgumentParser(description="Benchmark y regresión de procesamiento_datos y las marginalizaciones.")
+    parser.add_argument("--completo", action="store_true", help="Barrido completo: n de 10^2 a 10^7 y m de 2 a 20.")
+    parser.add_argument("-n", type=int, nargs="+", help="Valores de n a medir (reemplaza el barrido).")
+    parser.add_argument("-m", type=int, nargs="+", help="Valores de m a medir (reemplaza el barrido).")
+    parser.add_argument("--repeticiones", type=int, default=3, help="Ejecuciones por etapa; se guarda la más rápida.")
+    parser.add_argument("--semilla", type=int, default=0, help="Semilla de las muestras aleatorias.")
+    parser.add_argument("--max-celdas", type=int, default=2 * 10 ** 8, help="Celdas máximas de las matrices densas de una prueba.")
+    parser.add_argument("-o", "--salida", default="benchmark.json", help="Archivo JSON donde se guardan los resultados.")
+    parser.add_argument("--linea-base", help="Archivo JSON de una ejecución anterior con el que se comparan los tiempos.")
+    parser.add_argument("--umbral", type=float, default=0.25, help="Aumento relativo de tiempo que se considera regresión.")
+    parser.add_argument("--minimo-ms", type=float, default=5.0, help="Diferencia mínima en ms para considerar regresión.")
+    args = parser.parse_args(argumentos)
+
+    valores_n = args.n or (N_COMPLETO if args.completo else N_RAPIDO)
+    valores_m = args.m or (M_COMPLETO if args.completo else M_RAPIDO)
+    resultados = ejecutar(valores_n, valores_m, args.repeticiones, args.semilla, args.max_celdas)
+
+    with open(args.salida, "w") as archivo:
+        json.dump(resultados, archivo, indent=2)
+    print(f"Resultados guardados en {args.salida}")
+
+    fallas = list(resultados["errores"])
+    if args.linea_base:
+        with open(args.linea_base) as archivo:
+            fallas += comparar(resultados, json.load(archivo), args.umbral, args.minimo_ms / 1000)
+
+    for falla in fallas:
+        print(f"FALLA: {falla}")
+    return 1 if fallas else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,128 +1,3169 @@
 # Importación de librerías necesarias
+import argparse
+import functools
+import hashlib
+import io
+import json
+import operator
+import os
+import queue
+import struct
+import threading
+import time
 import numpy as np
-import pandas as pd
-import csv
-import tkinter as tk
-from ttkthemes import ThemedTk
-from tkinter import ttk, simpledialog, filedialog, messagebox
-from prettytable import PrettyTable
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from itertools import islice
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Las librerías de la interfaz gráfica (tkinter, ttkthemes, prettytable) se importan en
+# _importar_gui(), solo cuando se abre la ventana, para poder usar el modo por lotes sin pantalla.
+# Del mismo modo, multiprocessing, concurrent.futures, los módulos de medición (tracemalloc, cProfile,
+# pstats) y los de exportación (gzip, zipfile, tempfile) se importan solo en las funciones que los usan,
+# para que importar el módulo cueste poco más que importar NumPy.
+tk = ttk = simpledialog = filedialog = messagebox = ThemedTk = PrettyTable = None
+
+def _importar_gui():
+    """
+    Importa las librerías de la interfaz gráfica y las deja disponibles a nivel de módulo.
+    """
+    global tk, ttk, simpledialog, filedialog, messagebox, ThemedTk, PrettyTable
+    import tkinter as tk
+    from ttkthemes import ThemedTk
+    from tkinter import ttk, simpledialog, filedialog, messagebox
+    from prettytable import PrettyTable
+
+class _SinMedicion:
+    """
+    Contexto vacío que devuelve Instrumentacion.etapa() mientras la instrumentación está desactivada.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excepcion):
+        return False
+
+    def agregar_muestras(self, cantidad):
+        pass
+
+_SIN_MEDICION = _SinMedicion()
+
+def _registrando_memoria():
+    """
+    Indica si tracemalloc está registrando memoria (solo se consulta cuando se pidió medir memoria).
+    """
+    import tracemalloc
+
+    return tracemalloc.is_tracing()
+
+class _MedicionEtapa:
+    """
+    Mide una ejecución de una etapa: su tiempo y, si se pidió, el pico de memoria asignada durante ella.
+    """
+
+    def __init__(self, instrumentacion, nombre, muestras):
+        self.instrumentacion = instrumentacion
+        self.nombre = nombre
+        self.muestras = muestras
+        self.base = None
+        self.pico = 0
+
+    def agregar_muestras(self, cantidad):
+        self.muestras += cantidad
+
+    def __enter__(self):
+        pila = self.instrumentacion._pila()
+        if self.instrumentacion.medir_memoria and _registrando_memoria():
+            import tracemalloc
+
+            actual, pico = tracemalloc.get_traced_memory()
+            # El pico se reinicia para esta etapa; la etapa que la contiene conserva el que llevaba
+            if pila:
+                pila[-1].pico = max(pila[-1].pico, pico)
+            tracemalloc.reset_peak()
+            self.base = self.pico = actual
+        pila.append(self)
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *excepcion):
+        segundos = time.perf_counter() - self.inicio
+        pila = self.instrumentacion._pila()
+        pila.pop()
+        pico_mb = None
+        if self.base is not None and _registrando_memoria():
+            import tracemalloc
+
+            pico = max(self.pico, tracemalloc.get_traced_memory()[1])
+            if pila:
+                pila[-1].pico = max(pila[-1].pico, pico)
+            self.instrumentacion.pico_maximo = max(self.instrumentacion.pico_maximo, pico)
+            pico_mb = (pico - self.base) / 1024 ** 2
+        self.instrumentacion._registrar(self.nombre, segundos, self.muestras, pico_mb)
+        return False
+
+class Instrumentacion:
+    """
+    Registro de tiempos, muestras procesadas, contadores y picos de memoria de cada etapa del cálculo.
+
+    Las funciones instrumentadas usan etapa() (o el decorador medido) y contar(). Mientras la
+    instrumentación está desactivada esas llamadas solo comprueban el atributo activa, por lo que
+    pueden quedar siempre en el código. ejecucion() agrupa las mediciones de un cálculo completo y,
+    opcionalmente, lo perfila con cProfile o pyinstrument.
+    """
+
+    PERFILADORES = ("cprofile", "pyinstrument")
+
+    def __init__(self, activa=False, medir_memoria=False, perfilador=None):
+        """
+        Parameters:
+            activa (bool): Si es False no se mide nada.
+            medir_memoria (bool): Si es True ejecucion() activa tracemalloc para registrar el pico de
+                memoria de cada etapa (hace el cálculo bastante más lento).
+            perfilador (str | None): "cprofile", "pyinstrument" o None para no perfilar.
+        """
+        self.activa = activa
+        self.medir_memoria = medir_memoria
+        self.perfilador = perfilador
+        self._local = threading.local()
+        self._bloqueo = threading.Lock()
+        self.reiniciar()
+
+    def reiniciar(self):
+        """
+        Descarta todas las mediciones registradas.
+        """
+        self.descripcion = None
+        self.segundos_total = None
+        self.pico_total_mb = None
+        self.pico_maximo = 0
+        self.etapas = {}
+        self.contadores = {}
+        self.perfil = None
+
+    def _pila(self):
+        """
+        Etapas abiertas en el hilo actual (cada hilo mide sus propias etapas anidadas).
+        """
+        pila = getattr(self._local, "pila", None)
+        if pila is None:
+            pila = self._local.pila = []
+        return pila
+
+    def etapa(self, nombre, muestras=0):
+        """
+        Devuelve un contexto que mide el bloque de código que encierra como una ejecución de la etapa.
+
+        Parameters:
+            nombre (str): Nombre de la etapa en el reporte.
+            muestras (int): Muestras que procesa esta ejecución (se pueden sumar más con agregar_muestras).
+        """
+        if not self.activa:
+            return _SIN_MEDICION
+        return _MedicionEtapa(self, nombre, muestras)
+
+    def contar(self, nombre, cantidad=1):
+        """
+        Suma una cantidad al contador con el nombre dado (bytes leídos, aciertos de caché...).
+        """
+        if self.activa:
+            with self._bloqueo:
+                self.contadores[nombre] = self.contadores.get(nombre, 0) + cantidad
+
+    def _registrar(self, nombre, segundos, muestras, pico_mb):
+        with self._bloqueo:
+            etapa = self.etapas.setdefault(nombre, {"llamadas": 0, "segundos": 0.0, "muestras": 0, "pico_mb": None})
+            etapa["llamadas"] += 1
+            etapa["segundos"] += segundos
+            etapa["muestras"] += muestras
+            if pico_mb is not None:
+                etapa["pico_mb"] = max(etapa["pico_mb"] or 0.0, pico_mb)
+
+    @contextmanager
+    def ejecucion(self, descripcion):
+        """
+        Mide un cálculo completo: reinicia las mediciones y, según la configuración, activa tracemalloc
+        y el perfilador mientras dura el bloque.
+
+        Parameters:
+            descripcion (str): Nombre del cálculo en el reporte.
+        """
+        if not self.activa:
+            yield self
+            return
+        self.reiniciar()
+        self.descripcion = descripcion
+        iniciar_tracemalloc = self.medir_memoria and not _registrando_memoria()
+        if iniciar_tracemalloc:
+            import tracemalloc
+
+            tracemalloc.start()
+        perfil = self._iniciar_perfil()
+        inicio = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.segundos_total = time.perf_counter() - inicio
+            self.perfil = self._detener_perfil(perfil)
+            if iniciar_tracemalloc:
+                # Las etapas reinician el pico de tracemalloc; se combina con el mayor que registraron
+                self.pico_total_mb = max(self.pico_maximo, tracemalloc.get_traced_memory()[1]) / 1024 ** 2
+                tracemalloc.stop()
+
+    def _iniciar_perfil(self):
+        if self.perfilador == "cprofile":
+            import cProfile
+
+            perfil = cProfile.Profile()
+            perfil.enable()
+            return perfil
+        if self.perfilador == "pyinstrument":
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                raise ValueError("Para perfilar con pyinstrument instale el paquete pyinstrument.")
+            perfil = Profiler()
+            perfil.start()
+            return perfil
+        return None
+
+    @staticmethod
+    def _detener_perfil(perfil):
+        """
+        Detiene el perfilador y devuelve su informe como texto (None si no se perfiló).
+        """
+        if perfil is None:
+            return None
+        if hasattr(perfil, "output_text"):  # pyinstrument
+            perfil.stop()
+            return perfil.output_text()
+        import pstats
+
+        perfil.disable()
+        salida = io.StringIO()
+        pstats.Stats(perfil, stream=salida).sort_stats("cumulative").print_stats(30)
+        return salida.getvalue()
+
+    def reporte(self):
+        """
+        Devuelve las mediciones de la última ejecución.
+
+        Returns:
+            dict: Descripción y duración total, etapas (llamadas, segundos, muestras, muestras por
+                segundo y pico de memoria), contadores, picos de memoria del proceso y perfil en texto.
+        """
+        with self._bloqueo:
+            etapas = {nombre: dict(etapa) for nombre, etapa in self.etapas.items()}
+            contadores = dict(self.contadores)
+        for etapa in etapas.values():
+            etapa["muestras_por_segundo"] = etapa["muestras"] / etapa["segundos"] if etapa["muestras"] and etapa["segundos"] else None
+        rss_max_mb = None
+        if resource is not None:
+            # ru_maxrss está en KB en Linux
+            rss_max_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        return {
+            "descripcion": self.descripcion,
+            "segundos_total": self.segundos_total,
+            "etapas": etapas,
+            "contadores": contadores,
+            "pico_tracemalloc_mb": self.pico_total_mb,
+            "rss_max_mb": rss_max_mb,
+            "perfil": self.perfil,
+        }
+
+    def guardar_reporte(self, ruta):
+        """
+        Escribe el reporte de la última ejecución en un archivo JSON.
+        """
+        with open(ruta, "w") as archivo:
+            json.dump(self.reporte(), archivo, indent=2)
+        return ruta
+
+    def resumen(self):
+        """
+        Devuelve el reporte como texto legible, una línea por etapa ordenadas por tiempo.
+        """
+        reporte = self.reporte()
+        lineas = []
+        if reporte["descripcion"]:
+            lineas.append(f"{reporte['descripcion']}: {reporte['segundos_total']:.3f} s")
+        for nombre, etapa in sorted(reporte["etapas"].items(), key=lambda item: -item[1]["segundos"]):
+            linea = f"{nombre}: {etapa['segundos'] * 1000:.1f} ms en {etapa['llamadas']} llamadas"
+            if etapa["muestras_por_segundo"]:
+                linea += f", {etapa['muestras_por_segundo']:,.0f} muestras/s"
+            if etapa["pico_mb"] is not None:
+                linea += f", pico {etapa['pico_mb']:.1f} MB"
+            lineas.append(linea)
+        for nombre, valor in sorted(reporte["contadores"].items()):
+            lineas.append(f"{nombre}: {valor:,}")
+        if reporte["pico_tracemalloc_mb"] is not None:
+            lineas.append(f"Pico de memoria asignada: {reporte['pico_tracemalloc_mb']:.1f} MB")
+        if reporte["rss_max_mb"] is not None:
+            lineas.append(f"Pico de memoria residente del proceso: {reporte['rss_max_mb']:.1f} MB")
+        return "\n".join(lineas) if lineas else "No hay mediciones."
+
+# Instrumentación global; se activa desde la interfaz, con --reporte o con MATRICES_INSTRUMENTACION=1
+INSTRUMENTACION = Instrumentacion(activa=os.environ.get("MATRICES_INSTRUMENTACION") == "1")
+
+def medido(nombre, muestras=None):
+    """
+    Decorador que mide cada llamada de la función como una ejecución de la etapa nombre.
+
+    Parameters:
+        nombre (str): Nombre de la etapa.
+        muestras (callable | None): Recibe los mismos argumentos que la función y devuelve cuántas
+            muestras procesa la llamada.
+    """
+    def decorador(funcion):
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            if not INSTRUMENTACION.activa:
+                return funcion(*args, **kwargs)
+            with INSTRUMENTACION.etapa(nombre, muestras(*args, **kwargs) if muestras else 0):
+                return funcion(*args, **kwargs)
+        return envoltura
+    return decorador
+
+@medido("codificacion_estados", muestras=lambda muestras, m: len(muestras))
+def codificar_estados(muestras, m):
+    """
+    Convierte todas las muestras en un arreglo de índices de estado en un solo paso.
+
+    Cada muestra se interpreta como un número binario cuyo bit más significativo es el primer canal,
+    igual que int(''.join(map(str, muestra)), 2), pero calculado como el producto de la matriz de
+    muestras (uint8) por los pesos de cada bit.
+
+    Parameters:
+        muestras (list | np.ndarray | MuestrasEmpaquetadas): Muestras como lista de listas de bits,
+            arreglo de forma (n, m) o muestras de un archivo binario.
+        m (int): Número de canales.
+
+    Returns:
+        np.ndarray: Arreglo de enteros (int64) con el índice de estado de cada muestra.
+
+    Raises:
+        ValueError: Si alguna muestra no tiene exactamente m canales o algún valor no es 0 o 1.
+    """
+    if isinstance(muestras, MuestrasEmpaquetadas):
+        return muestras.estados()
+    try:
+        matriz_muestras = np.asarray(muestras)
+    except ValueError:
+        # Listas de distinto largo
+        raise ValueError(f"Todas las muestras deben tener {m} canales.") from None
+    if not matriz_muestras.size:
+        return np.zeros(0, dtype=np.int64)
+    if matriz_muestras.ndim != 2 or matriz_muestras.shape[1] != m:
+        raise ValueError(f"Todas las muestras deben tener {m} canales.")
+    if matriz_muestras.min() < 0 or matriz_muestras.max() > 1:
+        raise ValueError("Las muestras solo pueden contener los valores 0 y 1.")
+    matriz_muestras = matriz_muestras.astype(np.uint8, copy=False)
+    pesos_bits = np.left_shift(1, np.arange(m - 1, -1, -1, dtype=np.int64))
+    return matriz_muestras @ pesos_bits
+
+def decodificar_estados(estados, m):
+    """
+    Convierte índices de estado en muestras de m bits (la operación inversa de codificar_estados).
+
+    Parameters:
+        estados (np.ndarray): Índices de estado, entre 0 y 2^m - 1.
+        m (int): Número de canales.
+
+    Returns:
+        np.ndarray: Muestras de forma (len(estados), m) y tipo uint8, con el primer canal como bit más significativo.
+    """
+    desplazamientos = np.arange(m - 1, -1, -1, dtype=np.int64)
+    return ((np.asarray(estados, dtype=np.int64)[:, None] >> desplazamientos) & 1).astype(np.uint8)
+
+class MatrizDispersa:
+    """
+    Matriz dispersa en formato de coordenadas (COO) para sistemas con muchos canales.
+
+    Guarda solo las celdas no nulas como tres arreglos (filas, columnas, valores) ordenados por
+    posición y sin repetidos, de modo que la memoria depende del número de muestras y no de 2^m x 2^m.
+    Solo se convierte a una matriz densa cuando se pide explícitamente con toarray().
+    """
+
+    def __init__(self, filas, columnas, valores, forma):
+        """
+        Construye la matriz sumando los valores que caen en la misma celda.
+
+        Parameters:
+            filas (np.ndarray): Índices de fila de cada valor.
+            columnas (np.ndarray): Índices de columna de cada valor.
+            valores (np.ndarray): Valores a acumular en cada celda.
+            forma (tuple): Número de filas y columnas de la matriz.
+        """
+        self.shape = (int(forma[0]), int(forma[1]))
+        posiciones = np.asarray(filas, dtype=np.int64) * self.shape[1] + np.asarray(columnas, dtype=np.int64)
+        posiciones_unicas, inversos = np.unique(posiciones, return_inverse=True)
+        valores = np.asarray(valores)
+        self.valores = np.bincount(inversos.ravel(), weights=valores, minlength=len(posiciones_unicas))
+        if valores.dtype == np.float32:
+            # bincount suma siempre en float64; se conserva la precisión simple si los valores la tenían
+            self.valores = self.valores.astype(np.float32)
+        self.filas, self.columnas = np.divmod(posiciones_unicas, self.shape[1])
+
+    @classmethod
+    def _ordenada(cls, filas, columnas, valores, forma):
+        """
+        Crea la matriz a partir de celdas que ya están ordenadas y sin repetidos, sin volver a compactarlas.
+        """
+        matriz = cls.__new__(cls)
+        matriz.shape = (int(forma[0]), int(forma[1]))
+        matriz.filas, matriz.columnas, matriz.valores = filas, columnas, valores
+        return matriz
+
+    @property
+    def size(self):
+        """
+        Número de celdas de la matriz equivalente densa (igual que np.ndarray.size).
+        """
+        return self.shape[0] * self.shape[1]
+
+    @property
+    def nnz(self):
+        """
+        Número de celdas almacenadas.
+        """
+        return len(self.valores)
+
+    def toarray(self):
+        """
+        Convierte la matriz a un np.ndarray denso.
+
+        Returns:
+            np.ndarray: Matriz densa equivalente.
+        """
+        densa = np.zeros(self.shape, dtype=self.valores.dtype)
+        densa[self.filas, self.columnas] = self.valores
+        return densa
+
+    def copy(self):
+        """
+        Devuelve una copia independiente de la matriz.
+        """
+        return MatrizDispersa._ordenada(self.filas, self.columnas, self.valores.copy(), self.shape)
+
+    def sumar(self, filas, columnas, valores):
+        """
+        Devuelve una copia de la matriz con valores sumados en las celdas indicadas.
+
+        Si todas las celdas ya están almacenadas solo se actualizan sus valores, sin volver a ordenar la matriz.
+
+        Parameters:
+            filas (np.ndarray): Índices de fila de cada incremento.
+            columnas (np.ndarray): Índices de columna de cada incremento.
+            valores (float | np.ndarray): Valor de cada incremento.
+
+        Returns:
+            MatrizDispersa: Nueva matriz con los incrementos.
+        """
+        posiciones = self.filas * self.shape[1] + self.columnas
+        buscadas = np.asarray(filas, dtype=np.int64) * self.shape[1] + np.asarray(columnas, dtype=np.int64)
+        indices = np.minimum(np.searchsorted(posiciones, buscadas), max(self.nnz - 1, 0))
+        if self.nnz and np.array_equal(posiciones[indices], buscadas):
+            nuevos = self.valores.copy()
+            np.add.at(nuevos, indices, valores)
+            return MatrizDispersa._ordenada(self.filas, self.columnas, nuevos, self.shape)
+        return MatrizDispersa(
+            np.concatenate((self.filas, filas)),
+            np.concatenate((self.columnas, columnas)),
+            np.concatenate((self.valores, np.broadcast_to(valores, np.shape(filas)))).astype(self.valores.dtype, copy=False),
+            self.shape,
+        )
+
+    def ventana(self, fila_inicio, fila_fin, columna_inicio, columna_fin):
+        """
+        Devuelve como np.ndarray denso solo el rectángulo de celdas indicado.
+
+        Como las celdas están ordenadas por fila, el rango de filas se ubica con una búsqueda binaria.
+        """
+        desde, hasta = np.searchsorted(self.filas, [fila_inicio, fila_fin])
+        filas, columnas = self.filas[desde:hasta], self.columnas[desde:hasta]
+        seleccion = (columnas >= columna_inicio) & (columnas < columna_fin)
+        densa = np.zeros((fila_fin - fila_inicio, columna_fin - columna_inicio), dtype=self.valores.dtype)
+        densa[filas[seleccion] - fila_inicio, columnas[seleccion] - columna_inicio] = self.valores[desde:hasta][seleccion]
+        return densa
+
+    def reshape(self, *forma):
+        """
+        Cambia la forma de la matriz conservando el orden por filas, igual que np.ndarray.reshape.
+
+        Parameters:
+            forma (tuple): Nueva forma; admite -1 en una de las dos dimensiones.
+
+        Returns:
+            MatrizDispersa: Matriz con la nueva forma.
+        """
+        if len(forma) == 1:
+            forma = forma[0]
+        filas, columnas = forma
+        if filas == -1:
+            filas = self.size // columnas
+        elif columnas == -1:
+            columnas = self.size // filas
+        if filas * columnas != self.size:
+            raise ValueError(f"No se puede cambiar la forma {self.shape} a {(filas, columnas)}")
+        nuevas_filas, nuevas_columnas = np.divmod(self.filas * self.shape[1] + self.columnas, columnas)
+        return MatrizDispersa(nuevas_filas, nuevas_columnas, self.valores, (filas, columnas))
+
+    def __truediv__(self, escalar):
+        return MatrizDispersa._ordenada(self.filas, self.columnas, self.valores / escalar, self.shape)
+
+    @staticmethod
+    def concatenar(matrices, forma):
+        """
+        Suma varias matrices dispersas de la misma forma en una sola pasada.
+
+        Parameters:
+            matrices (list): Lista de MatrizDispersa a sumar.
+            forma (tuple): Forma común de las matrices.
+
+        Returns:
+            MatrizDispersa: Matriz con la suma de todas las celdas.
+        """
+        return MatrizDispersa(
+            np.concatenate([matriz.filas for matriz in matrices] + [np.zeros(0, dtype=np.int64)]),
+            np.concatenate([matriz.columnas for matriz in matrices] + [np.zeros(0, dtype=np.int64)]),
+            np.concatenate([matriz.valores for matriz in matrices] + [np.zeros(0)]),
+            forma,
+        )
+
+    def __repr__(self):
+        return f"MatrizDispersa(forma={self.shape}, celdas={self.nnz})"
+
+def _acumular_diagonal(estados, pesos, tam, dispersa=False, tipo=np.float64):
+    """
+    Acumula los pesos de cada estado en la diagonal de una matriz de tam x tam.
+
+    Parameters:
+        estados (np.ndarray): Índice de estado de cada incremento.
+        pesos (np.ndarray): Valor de cada incremento.
+        tam (int): Número de filas y columnas de la matriz.
+        dispersa (bool): Si es True devuelve una MatrizDispersa en lugar de un np.ndarray.
+        tipo (np.dtype): Tipo de punto flotante del resultado (las sumas se hacen en float64).
+
+    Returns:
+        np.ndarray | MatrizDispersa: Matriz diagonal con la suma de los pesos de cada estado.
+    """
+    if dispersa:
+        return MatrizDispersa(estados, estados, np.asarray(pesos, dtype=tipo), (tam, tam))
+    return np.diag(np.bincount(estados, weights=pesos, minlength=tam).astype(tipo, copy=False))
+
+def _pares_transicion(estados, m, estado_previo=None):
+    """
+    Calcula las celdas (fila, columna) que un bloque de estados aporta a las matrices de transición.
+
+    Parameters:
+        estados (np.ndarray): Índices de estado del bloque, en orden de llegada.
+        m (int): Número de canales.
+        estado_previo (int | None): Último estado del bloque anterior, o None si el bloque es el primero.
+
+    Returns:
+        dict: Tupla (filas, columnas) para 'EstadoEstadoF', 'EstadoCanalP' y 'EstadoEstadoP'.
+            Las dos primeras tienen m - 1 y m celdas por muestra, en el orden de las muestras.
+    """
+    # Sufijos muestra[j + 1:] para j < m - 1 y bit de cada canal
+    mascaras = np.left_shift(1, np.arange(m - 1, 0, -1, dtype=np.int64)) - 1
+    bits = np.left_shift(1, np.arange(m - 1, -1, -1, dtype=np.int64))
+
+    if estado_previo is None:
+        previos, actuales = estados[:-1], estados[1:]
+    else:
+        previos, actuales = np.concatenate(([estado_previo], estados[:-1])), estados
+
+    return {
+        'EstadoEstadoF': (np.repeat(estados, m - 1), (estados[:, None] & mascaras).ravel()),
+        'EstadoCanalP': ((estados[:, None] ^ bits).ravel(), np.repeat(estados, m)),
+        'EstadoEstadoP': (previos, actuales),
+    }
+
+class _ConteoDisperso:
+    """
+    Acumulador de conteos para matrices dispersas que se alimentan bloque a bloque.
+
+    Cada bloque se compacta por separado y los bloques pendientes se fusionan con el acumulado solo
+    cuando igualan su tamaño, de modo que el costo total de las fusiones crece como n log n.
+    """
+
+    def __init__(self, forma):
+        self.forma = forma
+        self.acumulado = MatrizDispersa([], [], [], forma)
+        self.pendientes = []
+        self.celdas_pendientes = 0
+
+    def agregar(self, filas, columnas, valores):
+        bloque = MatrizDispersa(filas, columnas, valores, self.forma)
+        if not self.acumulado.nnz and not self.pendientes:
+            # El primer bloque ya está compactado: no hace falta fusionarlo con el acumulado vacío
+            self.acumulado = bloque
+            return
+        self.pendientes.append(bloque)
+        self.celdas_pendientes += bloque.nnz
+        if self.celdas_pendientes >= self.acumulado.nnz:
+            self.matriz()
+
+    def matriz(self):
+        if self.pendientes:
+            self.acumulado = MatrizDispersa.concatenar([self.acumulado] + self.pendientes, self.forma)
+            self.pendientes = []
+            self.celdas_pendientes = 0
+        return self.acumulado
+
+def _tipo_conteo(cota):
+    """
+    Devuelve el tipo entero sin signo más pequeño (uint16, uint32 o uint64) que admite conteos de hasta cota.
+    """
+    if cota < 2 ** 16:
+        return np.uint16
+    return np.uint32 if cota < 2 ** 32 else np.uint64
+
+def _crear_conteo(forma, dispersa=False, tipo=np.uint16):
+    """
+    Crea un acumulador de conteos enteros vacío.
+
+    Parameters:
+        forma (tuple): Forma de la matriz de conteos.
+        dispersa (bool): Si es True los conteos se guardan en formato disperso.
+        tipo (np.dtype): Tipo entero de los conteos densos (ver _tipo_conteo).
+
+    Returns:
+        np.ndarray | _ConteoDisperso: Acumulador vacío.
+    """
+    if dispersa:
+        return _ConteoDisperso(forma)
+    return np.zeros(forma, dtype=tipo)
+
+def _agregar(conteo, filas, columnas, valores=1):
+    """
+    Suma valores en las celdas indicadas de un acumulador creado con _crear_conteo.
+
+    Parameters:
+        conteo (np.ndarray | _ConteoDisperso): Acumulador a actualizar (se modifica en el lugar).
+        filas (np.ndarray): Índices de fila de cada incremento.
+        columnas (np.ndarray): Índices de columna de cada incremento.
+        valores (int | float | np.ndarray): Valor de cada incremento.
+    """
+    if isinstance(conteo, _ConteoDisperso):
+        conteo.agregar(filas, columnas, np.broadcast_to(valores, np.shape(filas)))
+    else:
+        # Con valores del mismo tipo que los conteos np.add.at usa su camino rápido y no reserva
+        # arreglos temporales del tamaño de la matriz (a diferencia de np.bincount)
+        np.add.at(conteo.reshape(-1), filas * conteo.shape[1] + columnas, np.asarray(valores, dtype=conteo.dtype))
+
+def _valor_conteo(conteo):
+    """
+    Devuelve la matriz de un acumulador creado con _crear_conteo.
+    """
+    return conteo.matriz() if isinstance(conteo, _ConteoDisperso) else conteo
+
+def _sumar_conteo(conteo, matriz):
+    """
+    Suma una matriz de conteos completa (np.ndarray o MatrizDispersa) a un acumulador.
+    """
+    if isinstance(conteo, _ConteoDisperso):
+        conteo.agregar(matriz.filas, matriz.columnas, matriz.valores)
+    else:
+        conteo += matriz
+
+@medido("procesamiento_datos", muestras=lambda n, *args, **kwargs: n)
+def procesamiento_datos(n, m, muestras, dispersa=False, tipo=np.float64):
+    """
+    Calcula las matrices de transición para el canal y el estado a partir de las muestras dadas.
+
+    Las muestras se cuentan con enteros (ver ModeloTransiciones) y los pesos 1/n se aplican una sola
+    vez por celda al final, en lugar de sumar un incremento de punto flotante por muestra.
+
+    Parameters:
+        n (int): Número de muestras.
+        m (int): Número de canales.
+        muestras (list | MuestrasEmpaquetadas): Lista de muestras, donde cada muestra es una lista de bits,
+            o muestras de un archivo binario (ver cargar_binario).
+        dispersa (bool): Si es True las matrices se devuelven como MatrizDispersa, lo que permite
+            trabajar con 20 a 30 canales sin reservar 2^m x 2^m celdas.
+        tipo (np.dtype): np.float64 (por defecto) o np.float32 para ocupar la mitad de memoria.
+
+    Returns:
+        tuple: Tupla con las matrices de transición y las muestras originales.
+            - EstadoCanalF (np.ndarray): Matriz de transición para el canal al futuro.
+            - EstadoEstadoF (np.ndarray): Matriz de transición para el estado al futuro.
+            - EstadoCanalP (np.ndarray): Matriz de transición para el canal al pasado.
+            - EstadoEstadoP (np.ndarray): Matriz de transición para el estado al pasado.
+            - EstadoCanalF_aux (np.ndarray): Matriz auxiliar de transición para el canal al futuro.
+            - EstadoEstadoF_aux (np.ndarray): Matriz auxiliar de transición para el estado al futuro.
+            - muestras_almacenadas (list): Lista de muestras original.
+    """
+    tam = 2 ** m
+
+    # Copia de las muestras para mantener los datos originales
+    muestras_almacenadas = muestras.copy()
+
+    if not n:
+        # Sin muestras todas las matrices quedan en cero
+        vacia = MatrizDispersa([], [], np.zeros(0, dtype=tipo), (tam, tam)) if dispersa else np.zeros((tam, tam), dtype=tipo)
+        return tuple(vacia.copy() for _ in range(6)) + (muestras_almacenadas,)
+
+    # Conteos enteros de todas las muestras; matrices() aplica los pesos (1/n, y 1/(n - 1) para la última)
+    modelo = ModeloTransiciones(m, dispersa).actualizar_estados(codificar_estados(muestras[:n], m))
+
+    # Devuelve las matrices calculadas y las muestras originales
+    return modelo.matrices(tipo) + (muestras_almacenadas,)
+
+def procesamiento_datos_referencia(n, m, muestras):
+    """
+    Implementación de referencia (bucle muestra a muestra) de procesamiento_datos.
+
+    Se conserva para verificar que el motor vectorizado produce las mismas matrices.
+
+    Parameters:
+        n (int): Número de muestras.
+        m (int): Número de canales.
+        muestras (list): Lista de muestras, donde cada muestra es una lista de bits.
+
+    Returns:
+        tuple: Tupla con las matrices de transición y las muestras originales.
+            - EstadoCanalF (np.ndarray): Matriz de transición para el canal al futuro.
+            - EstadoEstadoF (np.ndarray): Matriz de transición para el estado al futuro.
+            - EstadoCanalP (np.ndarray): Matriz de transición para el canal al pasado.
+            - EstadoEstadoP (np.ndarray): Matriz de transición para el estado al pasado.
+            - EstadoCanalF_aux (np.ndarray): Matriz auxiliar de transición para el canal al futuro.
+            - EstadoEstadoF_aux (np.ndarray): Matriz auxiliar de transición para el estado al futuro.
+            - muestras_almacenadas (list): Lista de muestras original.
+    """
+    # Matrices de transición para el canal y el estado
+    EstadoCanalF = np.zeros((2 ** m, 2 ** m), dtype=float)
+    EstadoEstadoF = np.zeros((2 ** m, 2 ** m), dtype=float)
+    EstadoCanalP = np.zeros((2 ** m, 2 ** m), dtype=float)
+    EstadoEstadoP = np.zeros((2 ** m, 2 ** m), dtype=float)
+    
+    # Matrices auxiliares para el cálculo del estado futuro
+    EstadoCanalF_aux = np.zeros((2 ** m, 2 ** m), dtype=float)
+    EstadoEstadoF_aux = np.zeros((2 ** m, 2 ** m), dtype=float)
+    
+    # Copia de las muestras para mantener los datos originales
+    muestras_almacenadas = muestras.copy()
+
+    # Bucle sobre las muestras
+    for i in range(n):
+        muestra = muestras[i]
+
+        # Actualización de matrices de transición para el canal y el estado
+        for j in range(m):
+            EstadoCanalF[int(''.join(map(str, muestra)), 2)][int(''.join(map(str, muestra)), 2)] += 1 / (n - (i == n-1))
+            if j < m - 1:
+                EstadoEstadoF[int(''.join(map(str, muestra)), 2)][int(''.join(map(str, muestra[j + 1:])), 2)] += 1 / (n - (i == n-1))
+
+        # Actualización de matrices auxiliares
+        if i > 0:
+            EstadoCanalF_aux[int(''.join(map(str, muestra)), 2)][int(''.join(map(str, muestra)), 2)] += 1 / n
+            EstadoEstadoF_aux[int(''.join(map(str, muestra)), 2)][int(''.join(map(str, muestra)), 2)] += 1 / n
+
+        # Actualización de matrices de transición para el estado pasado
+        for j in range(m):
+            muestra_previa = muestra.copy()
+            muestra_previa[j] = 1 - muestra_previa[j]
+            EstadoCanalP[int(''.join(map(str, muestra_previa)), 2)][int(''.join(map(str, muestra)), 2)] += 1 / (n - (i == n-1))
+        if i > 0:
+            EstadoEstadoP[int(''.join(map(str, muestras[i - 1])), 2)][int(''.join(map(str, muestra)), 2)] += 1 / (n - (i == n-1))
+
+    # Devuelve las matrices calculadas y las muestras originales
+    return (
+        EstadoCanalF,
+        EstadoEstadoF,
+        EstadoCanalP,
+        EstadoEstadoP,
+        EstadoCanalF_aux,
+        EstadoEstadoF_aux,
+        muestras_almacenadas,
+    )
+
+# Número de muestras que se leen y procesan por bloque al cargar archivos grandes
+TAM_BLOQUE = 100_000
+
+# Número máximo de muestras de un archivo que se conservan para "Mostrar Datos"
+MAX_MUESTRAS_VISTA = 1000
+
+def leer_csv_por_bloques(ruta, tam_bloque=TAM_BLOQUE, inicio=0, fin=None):
+    """
+    Lee un archivo CSV de muestras en bloques de tamaño fijo, sin cargarlo completo en memoria.
+
+    Con inicio y fin se lee solo una parte del archivo: las filas que empiezan en el rango de bytes
+    [inicio, fin). Así varias partes consecutivas cubren el archivo sin repetir ni perder filas.
+
+    Parameters:
+        ruta (str): Ruta del archivo CSV (una muestra por fila, bits separados por comas).
+        tam_bloque (int): Número de filas por bloque.
+        inicio (int): Posición en bytes desde la que se buscan filas.
+        fin (int | None): Posición en bytes hasta la que se buscan filas (None para leer hasta el final).
+
+    Yields:
+        np.ndarray: Bloque de muestras de forma (filas, m) y tipo uint8.
+    """
+    with open(ruta, 'rb') as archivo:
+        if inicio:
+            # Se descarta la fila que empezó antes de inicio (pertenece a la parte anterior)
+            archivo.seek(inicio - 1)
+            archivo.readline()
+        posicion = archivo.tell()
+        while fin is None or posicion < fin:
+            with INSTRUMENTACION.etapa("lectura_csv") as medicion:
+                lineas = list(islice(archivo, tam_bloque))
+                if not lineas:
+                    break
+                if fin is not None:
+                    longitudes = np.fromiter(map(len, lineas), dtype=np.int64, count=len(lineas))
+                    inicios = posicion + np.cumsum(longitudes) - longitudes
+                    posicion += int(longitudes.sum())
+                    lineas = lineas[:int(np.searchsorted(inicios, fin))]
+                if INSTRUMENTACION.activa:
+                    INSTRUMENTACION.contar("bytes_leidos", sum(map(len, lineas)))
+                bloque = np.loadtxt(lineas, delimiter=',', dtype=np.uint8, ndmin=2)
+                medicion.agregar_muestras(len(bloque))
+            if bloque.size:
+                yield bloque
+
+def _canales_csv(ruta):
+    """
+    Devuelve el número de canales de un archivo CSV leyendo solo su primera fila con datos.
+    """
+    with open(ruta, 'rb') as archivo:
+        for linea in archivo:
+            if linea.strip():
+                return len(linea.split(b','))
+    raise ValueError(f"El archivo {ruta} no contiene muestras.")
+
+# Formato binario de muestras: cabecera (identificador, versión, m, n) seguida de las filas
+# empaquetadas con np.packbits, ceil(m / 8) bytes por muestra y el primer canal en el bit más alto.
+EXTENSION_BINARIA = ".mdeb"
+IDENTIFICADOR_BINARIO = b"MDEB"
+VERSION_BINARIA = 1
+CABECERA_BINARIA = struct.Struct("<4sHHQ")
+
+class MuestrasEmpaquetadas:
+    """
+    Muestras de un archivo binario, mapeadas en memoria y desempaquetadas solo cuando se leen.
+
+    Se comporta como una secuencia de muestras: muestras[i] devuelve la fila i como arreglo de bits y
+    muestras[a:b] devuelve otra vista sin copiar datos. Los índices de estado se calculan directamente
+    desde los bytes empaquetados, sin pasar por los bits.
+    """
+
+    def __init__(self, empaquetadas, m):
+        """
+        Parameters:
+            empaquetadas (np.ndarray): Filas empaquetadas de forma (n, ceil(m / 8)), normalmente un np.memmap.
+            m (int): Número de canales.
+        """
+        self.empaquetadas = empaquetadas
+        self.m = m
+
+    @property
+    def shape(self):
+        return (len(self.empaquetadas), self.m)
+
+    def __len__(self):
+        return len(self.empaquetadas)
+
+    def __getitem__(self, indice):
+        if isinstance(indice, slice):
+            return MuestrasEmpaquetadas(self.empaquetadas[indice], self.m)
+        return np.unpackbits(self.empaquetadas[indice], count=self.m)
+
+    def copy(self):
+        # El mapeo es de solo lectura, así que basta con una nueva vista
+        return MuestrasEmpaquetadas(self.empaquetadas, self.m)
+
+    def desempaquetar(self):
+        """
+        Devuelve todas las muestras de la vista como un arreglo uint8 de forma (n, m).
+        """
+        return np.unpackbits(self.empaquetadas, axis=1, count=self.m)
+
+    @medido("lectura_binaria", muestras=lambda self: len(self))
+    def estados(self):
+        """
+        Calcula el índice de estado de cada muestra a partir de sus bytes empaquetados.
+
+        Returns:
+            np.ndarray: Arreglo de enteros (int64) con el índice de estado de cada muestra.
+        """
+        bytes_fila = self.empaquetadas.shape[1]
+        pesos_bytes = np.left_shift(np.uint64(1), np.arange(8 * (bytes_fila - 1), -1, -8, dtype=np.uint64))
+        valores = self.empaquetadas.astype(np.uint64) @ pesos_bytes
+        return (valores >> np.uint64(8 * bytes_fila - self.m)).astype(np.int64)
+
+    def bloques_estados(self, tam_bloque=TAM_BLOQUE):
+        """
+        Recorre los índices de estado en bloques de tamaño fijo.
+
+        Yields:
+            np.ndarray: Índices de estado de cada bloque.
+        """
+        for inicio in range(0, len(self), tam_bloque):
+            bloque = self[inicio:inicio + tam_bloque]
+            INSTRUMENTACION.contar("bytes_leidos", bloque.empaquetadas.size)
+            yield bloque.estados()
+
+def es_binario(ruta):
+    """
+    Indica si un archivo tiene el formato binario de muestras (según su identificador, no su extensión).
+    """
+    with open(ruta, 'rb') as archivo:
+        return archivo.read(len(IDENTIFICADOR_BINARIO)) == IDENTIFICADOR_BINARIO
+
+def cargar_binario(ruta):
+    """
+    Abre un archivo binario de muestras mapeándolo en memoria (sin copiar su contenido).
+
+    Parameters:
+        ruta (str): Ruta del archivo binario.
+
+    Returns:
+        MuestrasEmpaquetadas: Muestras del archivo.
+    """
+    with open(ruta, 'rb') as archivo:
+        identificador, version, m, n = CABECERA_BINARIA.unpack(archivo.read(CABECERA_BINARIA.size))
+    if identificador != IDENTIFICADOR_BINARIO or version != VERSION_BINARIA:
+        raise ValueError(f"El archivo {ruta} no es un archivo binario de muestras válido.")
+    bytes_fila = (m + 7) // 8
+    if not n:
+        return MuestrasEmpaquetadas(np.zeros((0, bytes_fila), dtype=np.uint8), m)
+    empaquetadas = np.memmap(ruta, dtype=np.uint8, mode='r', offset=CABECERA_BINARIA.size, shape=(n, bytes_fila))
+    return MuestrasEmpaquetadas(empaquetadas, m)
+
+def guardar_binario(ruta, bloques):
+    """
+    Escribe muestras en el formato binario, empaquetando un bloque a la vez.
+
+    Parameters:
+        ruta (str): Ruta del archivo de salida.
+        bloques (iterable | np.ndarray | list): Muestras (lista o arreglo de forma (n, m)) o un iterable
+            de bloques de muestras, por ejemplo de leer_csv_por_bloques.
+
+    Returns:
+        int: Número de muestras escritas.
+
+    Raises:
+        ValueError: Si los bloques no tienen todos el mismo número de canales o algún valor no es 0 o 1.
+    """
+    if isinstance(bloques, (list, np.ndarray)):
+        bloques = [np.asarray(bloques)]
+    n = 0
+    m = None
+    with open(ruta, 'wb') as archivo:
+        archivo.write(bytes(CABECERA_BINARIA.size))  # La cabecera se completa al conocer n
+        for bloque in bloques:
+            if m is None:
+                m = bloque.shape[1]
+            elif bloque.shape[1] != m:
+                raise ValueError(f"Todas las muestras deben tener {m} canales.")
+            # np.packbits guarda como 1 cualquier valor distinto de cero: se rechazan como en codificar_estados
+            if bloque.size and (bloque.min() < 0 or bloque.max() > 1):
+                raise ValueError("Las muestras solo pueden contener los valores 0 y 1.")
+            archivo.write(np.packbits(bloque.astype(np.uint8, copy=False), axis=1).tobytes())
+            n += len(bloque)
+        if m is None:
+            raise ValueError("No hay muestras para guardar.")
+        archivo.seek(0)
+        archivo.write(CABECERA_BINARIA.pack(IDENTIFICADOR_BINARIO, VERSION_BINARIA, m, n))
+    return n
+
+def convertir_csv_a_binario(ruta_csv, ruta_binaria=None, tam_bloque=TAM_BLOQUE):
+    """
+    Convierte un archivo CSV de muestras al formato binario, bloque a bloque.
+
+    Parameters:
+        ruta_csv (str): Ruta del archivo CSV.
+        ruta_binaria (str | None): Ruta de salida (por defecto, la del CSV con extensión EXTENSION_BINARIA).
+        tam_bloque (int): Número de filas por bloque.
+
+    Returns:
+        str: Ruta del archivo binario escrito.
+    """
+    ruta_binaria = ruta_binaria or os.path.splitext(ruta_csv)[0] + EXTENSION_BINARIA
+    guardar_binario(ruta_binaria, leer_csv_por_bloques(ruta_csv, tam_bloque))
+    return ruta_binaria
+
+def canales_archivo(ruta):
+    """
+    Devuelve el número de canales de un archivo de muestras CSV o binario.
+    """
+    return cargar_binario(ruta).m if es_binario(ruta) else _canales_csv(ruta)
+
+def leer_estados_por_bloques(ruta, tam_bloque=TAM_BLOQUE, inicio=0, fin=None):
+    """
+    Lee los índices de estado de un archivo de muestras CSV o binario en bloques de tamaño fijo.
+
+    Con inicio y fin se leen solo las muestras que empiezan en el rango de bytes [inicio, fin).
+
+    Parameters:
+        ruta (str): Ruta del archivo de muestras.
+        tam_bloque (int): Número de muestras por bloque.
+        inicio (int): Posición en bytes desde la que se buscan muestras.
+        fin (int | None): Posición en bytes hasta la que se buscan muestras (None para leer hasta el final).
+
+    Yields:
+        np.ndarray: Índices de estado de cada bloque.
+    """
+    if es_binario(ruta):
+        muestras = cargar_binario(ruta)
+        bytes_fila = muestras.empaquetadas.shape[1]
+        primera = max(0, -(-(inicio - CABECERA_BINARIA.size) // bytes_fila))
+        ultima = len(muestras) if fin is None else max(0, -(-(fin - CABECERA_BINARIA.size) // bytes_fila))
+        yield from muestras[primera:ultima].bloques_estados(tam_bloque)
+    else:
+        m = _canales_csv(ruta)
+        for bloque in leer_csv_por_bloques(ruta, tam_bloque, inicio, fin):
+            yield codificar_estados(bloque, m)
+
+@medido("ponderacion")
+def _matrices_desde_conteos(conteo_diagonal, conteos, n, m, estado_primero, estado_penultimo, estado_ultimo, dispersa=False, tipo=np.float64):
+    """
+    Convierte los conteos enteros acumulados en las matrices ponderadas de procesamiento_datos.
+
+    Todas las muestras pesan 1/n salvo la última, que pesa 1/(n - 1); por eso la contribución de la
+    última muestra se corrige al final en lugar de conocer n de antemano.
+
+    Parameters:
+        conteo_diagonal (np.ndarray | MatrizDispersa): Veces que aparece cada estado, con forma (1, 2^m).
+        conteos (dict): Conteos de 'EstadoEstadoF', 'EstadoCanalP' y 'EstadoEstadoP'.
+        n (int): Número total de muestras.
+        m (int): Número de canales.
+        estado_primero (int): Estado de la primera muestra.
+        estado_penultimo (int | None): Estado de la penúltima muestra (None si n == 1).
+        estado_ultimo (int): Estado de la última muestra.
+        dispersa (bool): Si es True las matrices se devuelven como MatrizDispersa.
+        tipo (np.dtype): Tipo de punto flotante de las matrices (np.float64 o np.float32).
+
+    Returns:
+        tuple: Las seis matrices en el mismo orden que procesamiento_datos.
+    """
+    tam = 2 ** m
+    correccion = 1 / (n - 1) - 1 / n
+
+    # Celdas que aporta la última muestra, que reciben la corrección de peso
+    ultimo = np.array([estado_ultimo], dtype=np.int64)
+    pares_ultimo = _pares_transicion(ultimo, m, estado_penultimo)
+
+    if dispersa:
+        estados, apariciones = conteo_diagonal.columnas, conteo_diagonal.valores
+    else:
+        estados = np.nonzero(conteo_diagonal[0])[0]
+        apariciones = conteo_diagonal[0, estados]
+    # Los conteos son enteros sin signo pequeños: se escalan con un factor de punto flotante para no desbordarlos
+    EstadoCanalF = _acumular_diagonal(
+        np.concatenate((estados, ultimo)), np.concatenate((apariciones * (m / n), [m * correccion])), tam, dispersa, tipo
+    )
+    pesos_aux = np.concatenate((apariciones * (1 / n), [-1 / n]))
+    EstadoCanalF_aux = _acumular_diagonal(np.concatenate((estados, [estado_primero])), pesos_aux, tam, dispersa, tipo)
+    EstadoEstadoF_aux = _acumular_diagonal(np.concatenate((estados, [estado_primero])), pesos_aux, tam, dispersa, tipo)
+
+    matrices = {}
+    for nombre, (filas, columnas) in pares_ultimo.items():
+        matriz = conteos[nombre]
+        if dispersa:
+            # Las celdas de la última muestra ya están en los conteos: solo se corrige su valor
+            escalada = MatrizDispersa._ordenada(matriz.filas, matriz.columnas, np.divide(matriz.valores, n, dtype=tipo), matriz.shape)
+            matrices[nombre] = escalada.sumar(filas, columnas, correccion)
+        else:
+            matrices[nombre] = np.multiply(matriz, 1 / n, dtype=tipo)
+            np.add.at(matrices[nombre], (filas, columnas), correccion)
+
+    return (
+        EstadoCanalF,
+        matrices['EstadoEstadoF'],
+        matrices['EstadoCanalP'],
+        matrices['EstadoEstadoP'],
+        EstadoCanalF_aux,
+        EstadoEstadoF_aux,
+    )
+
+class ModeloTransiciones:
+    """
+    Modelo incremental de las matrices de transición.
+
+    Guarda los conteos enteros de cada matriz y los estados de frontera (primero, penúltimo y último),
+    de modo que nuevas muestras se incorporan con actualizar() en tiempo proporcional a las muestras
+    nuevas. Las matrices ponderadas de procesamiento_datos se calculan solo cuando se piden y no se
+    guardan en el modelo: quien las pide decide cuánto tiempo conservarlas.
+
+    Los conteos densos usan el tipo entero sin signo más pequeño que admite la cota de sus celdas
+    (n * m, ver _tipo_conteo): uint16 para pocas muestras y uint32 en la mayoría de los casos, con lo que
+    ocupan entre la cuarta parte y la mitad que en int64. Se convierten a un tipo mayor cuando hace falta.
+    """
+
+    NOMBRES_CONTEOS = ('EstadoEstadoF', 'EstadoCanalP', 'EstadoEstadoP')
+
+    def __init__(self, m, dispersa=False):
+        """
+        Crea un modelo vacío.
+
+        Parameters:
+            m (int): Número de canales.
+            dispersa (bool): Si es True los conteos y las matrices usan MatrizDispersa.
+        """
+        self.m = m
+        self.dispersa = dispersa
+        self.n = 0
+        self.estado_primero = self.estado_penultimo = self.estado_ultimo = None
+
+        # Cota superior del valor de cualquier celda de los conteos; decide su tipo entero
+        self.cota = 0
+        self._compartido = False
+
+        tam = 2 ** m
+        self._conteo_diagonal = _crear_conteo((1, tam), dispersa, _tipo_conteo(0))
+        self._conteos = {nombre: _crear_conteo((tam, tam), dispersa, _tipo_conteo(0)) for nombre in self.NOMBRES_CONTEOS}
+
+    def _reservar(self, incremento):
+        """
+        Aumenta la cota de los conteos y, si su tipo entero ya no la admite, los convierte a uno mayor.
+
+        Parameters:
+            incremento (int): Máximo que puede crecer cualquier celda con la actualización que sigue.
+        """
+        self.cota += incremento
+        if self.dispersa:
+            return
+        tipo = np.dtype(_tipo_conteo(self.cota))
+        if tipo.itemsize <= self._conteo_diagonal.dtype.itemsize:
+            return
+        if self._compartido:
+            raise OverflowError(f"Los conteos compartidos de tipo {self._conteo_diagonal.dtype} no admiten valores hasta {self.cota}.")
+        self._conteo_diagonal = self._conteo_diagonal.astype(tipo)
+        self._conteos = {nombre: conteo.astype(tipo) for nombre, conteo in self._conteos.items()}
+
+    def actualizar(self, muestras):
+        """
+        Incorpora nuevas muestras al modelo.
+
+        Parameters:
+            muestras (list | np.ndarray): Muestras nuevas, como lista de listas de bits o arreglo (filas, m).
+
+        Returns:
+            ModeloTransiciones: El propio modelo, para encadenar llamadas.
+        """
+        return self.actualizar_estados(codificar_estados(muestras, self.m))
+
+    @medido("acumulacion", muestras=lambda self, estados: len(estados))
+    def actualizar_estados(self, estados):
+        """
+        Incorpora nuevas muestras ya codificadas como índices de estado.
+
+        Parameters:
+            estados (np.ndarray): Índices de estado de las muestras nuevas, en orden de llegada.
+
+        Returns:
+            ModeloTransiciones: El propio modelo, para encadenar llamadas.
+        """
+        estados = np.asarray(estados, dtype=np.int64)
+        if not len(estados):
+            return self
+
+        # Cada muestra suma a lo sumo m a una misma celda (m incrementos en EstadoCanalP)
+        self._reservar(len(estados) * self.m)
+        _agregar(self._conteo_diagonal, np.zeros_like(estados), estados)
+        for nombre, (filas, columnas) in _pares_transicion(estados, self.m, self.estado_ultimo).items():
+            _agregar(self._conteos[nombre], filas, columnas)
+
+        # Estados de frontera para enlazar la siguiente actualización y corregir el peso de la última muestra
+        if self.estado_primero is None:
+            self.estado_primero = int(estados[0])
+        self.estado_penultimo = int(estados[-2]) if len(estados) > 1 else self.estado_ultimo
+        self.estado_ultimo = int(estados[-1])
+        self.n += len(estados)
+        return self
+
+    @classmethod
+    def desde_conteos(cls, m, conteo_diagonal, conteos, n=0, estado_primero=None, estado_penultimo=None, estado_ultimo=None):
+        """
+        Crea un modelo denso que usa directamente los arreglos de conteos dados (sin copiarlos).
+
+        Permite, por ejemplo, que un proceso acumule sus conteos sobre memoria compartida. Como los
+        arreglos no se pueden reemplazar, su tipo entero debe admitir todas las muestras que se cuenten
+        (si no, actualizar() lanza OverflowError).
+
+        Parameters:
+            m (int): Número de canales.
+            conteo_diagonal (np.ndarray): Apariciones de cada estado, con forma (1, 2^m).
+            conteos (dict): Arreglos de 2^m x 2^m para 'EstadoEstadoF', 'EstadoCanalP' y 'EstadoEstadoP'.
+            n (int): Número de muestras ya contadas.
+            estado_primero (int | None): Estado de la primera muestra contada.
+            estado_penultimo (int | None): Estado de la penúltima muestra contada.
+            estado_ultimo (int | None): Estado de la última muestra contada.
+
+        Returns:
+            ModeloTransiciones: Modelo que comparte los arreglos de conteos.
+        """
+        modelo = cls(m)
+        modelo._conteo_diagonal = conteo_diagonal
+        modelo._conteos = {nombre: conteos[nombre] for nombre in cls.NOMBRES_CONTEOS}
+        modelo.n = n
+        modelo.cota = n * m
+        modelo._compartido = True
+        modelo.estado_primero, modelo.estado_penultimo, modelo.estado_ultimo = estado_primero, estado_penultimo, estado_ultimo
+        return modelo
+
+    def combinar(self, otro, contiguo=False):
+        """
+        Suma los conteos de otro modelo, como si sus muestras llegaran después de las de este.
+
+        Parameters:
+            otro (ModeloTransiciones): Modelo con el mismo número de canales.
+            contiguo (bool): True si las muestras de otro continúan a las de este (partes de una misma
+                grabación): se cuenta la transición del último estado de este modelo al primero de otro.
+                False para grabaciones independientes, en las que esa transición no existe.
+
+        Returns:
+            ModeloTransiciones: El propio modelo, para encadenar llamadas.
+        """
+        if otro.m != self.m:
+            raise ValueError(f"No se pueden combinar modelos de {self.m} y {otro.m} canales.")
+        if not otro.n:
+            return self
+        self._sumar_conteos(otro.conteos(), otro.cota)
+        self._enlazar(otro.n, otro.estado_primero, otro.estado_penultimo, otro.estado_ultimo, contiguo)
+        return self
+
+    def _sumar_conteos(self, conteos, cota):
+        """
+        Suma conteos enteros (con las claves de conteos()) cuyas celdas valen a lo sumo cota.
+        """
+        self._reservar(cota)
+        _sumar_conteo(self._conteo_diagonal, conteos['diagonal'])
+        for nombre in self.NOMBRES_CONTEOS:
+            _sumar_conteo(self._conteos[nombre], conteos[nombre])
+
+    def _enlazar(self, n, estado_primero, estado_penultimo, estado_ultimo, contiguo):
+        """
+        Actualiza los estados de frontera con los de n muestras que llegan después de las ya contadas.
+
+        Sus conteos se suman aparte (ver _sumar_conteos); aquí solo se agrega, si contiguo es True, la
+        transición del último estado contado al primero de las muestras nuevas.
+        """
+        enlazar = contiguo and self.n > 0
+        if enlazar:
+            self._reservar(1)
+            _agregar(self._conteos['EstadoEstadoP'], np.array([self.estado_ultimo]), np.array([estado_primero]))
+
+        if self.estado_primero is None:
+            self.estado_primero = estado_primero
+        if n > 1:
+            self.estado_penultimo = estado_penultimo
+        else:
+            # La última muestra solo tiene una transición de entrada si las partes están enlazadas
+            self.estado_penultimo = self.estado_ultimo if enlazar else None
+        self.estado_ultimo = estado_ultimo
+        self.n += n
+
+    def conteos(self):
+        """
+        Devuelve los conteos enteros acumulados.
+
+        Returns:
+            dict: Conteos de 'diagonal' (apariciones de cada estado, forma (1, 2^m)), 'EstadoEstadoF',
+                'EstadoCanalP' y 'EstadoEstadoP'. Los densos son enteros sin signo; se pueden pasar
+                directamente a normalizar() para obtener probabilidades de transición.
+        """
+        conteos = {nombre: _valor_conteo(conteo) for nombre, conteo in self._conteos.items()}
+        conteos['diagonal'] = _valor_conteo(self._conteo_diagonal)
+        return conteos
+
+    def matrices(self, tipo=np.float64):
+        """
+        Calcula las matrices ponderadas a partir de los conteos (en cada llamada, sin guardarlas).
+
+        Parameters:
+            tipo (np.dtype): np.float64 (por defecto) o np.float32 para ocupar la mitad de memoria.
+
+        Returns:
+            tuple: Las seis matrices en el mismo orden que procesamiento_datos.
+        """
+        if not self.n:
+            raise ValueError("No hay muestras para procesar.")
+        conteos = self.conteos()
+        return _matrices_desde_conteos(
+            conteos.pop('diagonal'), conteos, self.n, self.m,
+            self.estado_primero, self.estado_penultimo, self.estado_ultimo, self.dispersa, np.dtype(tipo),
+        )
+
+    @property
+    def EstadoCanalF(self):
+        return self.matrices()[0]
+
+    @property
+    def EstadoEstadoF(self):
+        return self.matrices()[1]
+
+    @property
+    def EstadoCanalP(self):
+        return self.matrices()[2]
+
+    @property
+    def EstadoEstadoP(self):
+        return self.matrices()[3]
+
+def procesamiento_datos_por_bloques(bloques, dispersa=False):
+    """
+    Calcula las matrices de transición actualizando un ModeloTransiciones bloque a bloque.
+
+    La memoria usada no depende del número total de muestras: de cada bloque solo se conservan los
+    conteos y los últimos estados, necesarios para las transiciones de EstadoEstadoP entre bloques.
+
+    Parameters:
+        bloques (iterable): Bloques de muestras de forma (filas, m), por ejemplo de leer_csv_por_bloques.
+        dispersa (bool): Si es True las matrices se devuelven como MatrizDispersa.
+
+    Returns:
+        tuple: Las seis matrices en el mismo orden que procesamiento_datos, seguidas de None en lugar
+            de las muestras almacenadas.
+    """
+    modelo = None
+    for bloque in bloques:
+        if modelo is None:
+            modelo = ModeloTransiciones(bloque.shape[1], dispersa)
+        modelo.actualizar(bloque)
+
+    if modelo is None:
+        raise ValueError("No hay muestras para procesar.")
+    return modelo.matrices() + (None,)
+
+class ModeloRetardos:
+    """
+    Conteos de transiciones de estado a estado para todos los retardos k = 1..L en una sola pasada.
+
+    El conteo del retardo k en la celda (i, j) es el número de veces que el estado j aparece k muestras
+    después del estado i; con k = 1 coincide con los conteos de EstadoEstadoP. Cada bloque de estados
+    se cuenta una sola vez para todos los retardos (un único np.add.at sobre índices desplazados en
+    k * 2^m * 2^m), y de un bloque a otro solo se conservan los últimos L estados.
+    """
+
+    def __init__(self, m, max_retardo, dispersa=False):
+        """
+        Crea un modelo vacío.
+
+        Parameters:
+            m (int): Número de canales.
+            max_retardo (int): Retardo máximo L.
+            dispersa (bool): Si es True los conteos se guardan como MatrizDispersa (L * 2^m filas).
+        """
+        if max_retardo < 1:
+            raise ValueError("El retardo máximo debe ser al menos 1.")
+        self.m = m
+        self.max_retardo = max_retardo
+        self.dispersa = dispersa
+        self.n = 0
+        self._cola = np.zeros(0, dtype=np.int64)
+
+        tam = 2 ** m
+        self._conteos = _crear_conteo((max_retardo * tam, tam), dispersa, _tipo_conteo(0))
+
+    def actualizar(self, muestras):
+        """
+        Incorpora nuevas muestras (lista de listas de bits o arreglo (filas, m)).
+
+        Returns:
+            ModeloRetardos: El propio modelo, para encadenar llamadas.
+        """
+        return self.actualizar_estados(codificar_estados(muestras, self.m))
+
+    @medido("acumulacion_retardos", muestras=lambda self, estados: len(estados))
+    def actualizar_estados(self, estados):
+        """
+        Incorpora nuevas muestras ya codificadas como índices de estado.
+
+        Parameters:
+            estados (np.ndarray): Índices de estado de las muestras nuevas, en orden de llegada.
+
+        Returns:
+            ModeloRetardos: El propio modelo, para encadenar llamadas.
+        """
+        estados = np.asarray(estados, dtype=np.int64)
+        if not len(estados):
+            return self
+        tam = 2 ** self.m
+
+        # Los últimos estados del bloque anterior solo aparecen como origen de las transiciones
+        extendidos = np.concatenate((self._cola, estados))
+        previos = len(self._cola)
+        inicios = [max(previos, k) for k in range(1, self.max_retardo + 1)]
+        tamanos = [max(len(extendidos) - inicio, 0) for inicio in inicios]
+
+        indices = np.empty(sum(tamanos), dtype=np.int64)
+        posicion = 0
+        for k, (inicio, tamano) in enumerate(zip(inicios, tamanos), start=1):
+            if not tamano:
+                continue
+            origenes = extendidos[inicio - k:len(extendidos) - k]
+            indices[posicion:posicion + tamano] = ((k - 1) * tam + origenes) * tam + extendidos[inicio:]
+            posicion += tamano
+
+        if self.dispersa:
+            _agregar(self._conteos, *np.divmod(indices, tam))
+        else:
+            # Cada muestra suma a lo sumo 1 a cada matriz de retardo
+            tipo = np.dtype(_tipo_conteo(self.n + len(estados)))
+            if tipo.itemsize > self._conteos.dtype.itemsize:
+                self._conteos = self._conteos.astype(tipo)
+            np.add.at(self._conteos.reshape(-1), indices, self._conteos.dtype.type(1))
+
+        self._cola = extendidos[-self.max_retardo:].copy()
+        self.n += len(estados)
+        return self
+
+    def conteos(self, retardo):
+        """
+        Devuelve los conteos de las transiciones con el retardo dado.
+
+        Parameters:
+            retardo (int): Retardo k, entre 1 y max_retardo.
+
+        Returns:
+            np.ndarray | MatrizDispersa: Conteos de 2^m x 2^m (filas: estado en t, columnas: estado en t + k).
+                Los densos son una vista de solo lectura de los conteos del modelo; los dispersos, una copia.
+        """
+        if not 1 <= retardo <= self.max_retardo:
+            raise ValueError(f"El retardo debe estar entre 1 y {self.max_retardo}.")
+        tam = 2 ** self.m
+        desde, hasta = (retardo - 1) * tam, retardo * tam
+        if self.dispersa:
+            conteo = _valor_conteo(self._conteos)
+            inicio, fin = np.searchsorted(conteo.filas, [desde, hasta])
+            return MatrizDispersa._ordenada(
+                conteo.filas[inicio:fin] - desde, conteo.columnas[inicio:fin].copy(), conteo.valores[inicio:fin].copy(), (tam, tam)
+            )
+        vista = self._conteos[desde:hasta]
+        vista.flags.writeable = False
+        return vista
+
+    def matriz(self, retardo, tipo=np.float64):
+        """
+        Devuelve la matriz de transición empírica con el retardo dado (cada fila suma 1).
+
+        Parameters:
+            retardo (int): Retardo k, entre 1 y max_retardo.
+            tipo (np.dtype): np.float64 o np.float32.
+
+        Returns:
+            np.ndarray | MatrizDispersa: Probabilidad de pasar del estado i al estado j en k muestras.
+        """
+        return normalizar(self.conteos(retardo), tipo)
+
+    def predictor(self, tipo=np.float64):
+        """
+        Devuelve un PredictorPasos basado en la matriz de transición de retardo 1.
+        """
+        return PredictorPasos(self.matriz(1, tipo))
+
+class PredictorPasos:
+    """
+    Predice la distribución de estados k pasos adelante elevando una matriz de transición a la k.
+
+    Las potencias P^(2^i) se calculan una vez por elevación al cuadrado repetida y se guardan, de modo
+    que P^k (o una distribución multiplicada por P^k) se obtiene combinando las potencias de los bits
+    de k, con log2(k) productos de matrices como máximo.
+    """
+
+    def __init__(self, matriz):
+        """
+        Parameters:
+            matriz (np.ndarray | MatrizDispersa): Matriz de transición de un paso (filas que suman 1).
+                Las dispersas se convierten a densas, por lo que se usa con pocos canales.
+        """
+        matriz = matriz.toarray() if isinstance(matriz, MatrizDispersa) else np.asarray(matriz)
+        if matriz.ndim != 2 or matriz.shape[0] != matriz.shape[1]:
+            raise ValueError("La matriz de transición debe ser cuadrada.")
+        self._cuadrados = [matriz]
+
+    def _cuadrado(self, i):
+        """
+        Devuelve P^(2^i), calculando y guardando las potencias que falten.
+        """
+        while len(self._cuadrados) <= i:
+            anterior = self._cuadrados[-1]
+            self._cuadrados.append(anterior @ anterior)
+        return self._cuadrados[i]
+
+    def potencia(self, pasos):
+        """
+        Devuelve la matriz de transición de pasos pasos, P^pasos.
+        """
+        pasos = operator.index(pasos)
+        if pasos < 0:
+            raise ValueError("El número de pasos no puede ser negativo.")
+        resultado = None
+        for i in range(pasos.bit_length()):
+            if pasos >> i & 1:
+                resultado = self._cuadrado(i) if resultado is None else resultado @ self._cuadrado(i)
+        if resultado is None:
+            return np.eye(self._cuadrados[0].shape[0], dtype=self._cuadrados[0].dtype)
+        return resultado
+
+    def predecir(self, distribucion, pasos):
+        """
+        Calcula la distribución de estados pasos pasos después de la dada.
+
+        Parameters:
+            distribucion (int | np.ndarray): Estado inicial (índice) o vector de probabilidades de cada estado.
+            pasos (int): Número de pasos k.
+
+        Returns:
+            np.ndarray: Probabilidad de cada estado después de k pasos.
+        """
+        pasos = operator.index(pasos)
+        if pasos < 0:
+            raise ValueError("El número de pasos no puede ser negativo.")
+        tam = self._cuadrados[0].shape[0]
+        if np.isscalar(distribucion):
+            vector = np.zeros(tam, dtype=self._cuadrados[0].dtype)
+            vector[int(distribucion)] = 1
+        else:
+            vector = np.asarray(distribucion, dtype=self._cuadrados[0].dtype)
+        # Un vector por cada potencia guardada cuesta 2^m x 2^m operaciones, en lugar de 2^m x 2^m x 2^m
+        for i in range(pasos.bit_length()):
+            if pasos >> i & 1:
+                vector = vector @ self._cuadrado(i)
+        return vector
+
+class CalculoCancelado(Exception):
+    """
+    Se lanza dentro de un cálculo por bloques cuando se pidió cancelarlo.
+    """
+
+def _seguir_bloques(bloques, total, progreso=None, cancelado=None, peso=len):
+    """
+    Recorre bloques informando el avance y comprobando entre bloques si se pidió cancelar.
+
+    Parameters:
+        bloques (iterable): Bloques a recorrer.
+        total (int): Número total (o estimado) de elementos, para calcular la fracción de avance.
+        progreso (callable | None): Recibe la fracción de avance, entre 0 y 1.
+        cancelado (threading.Event | None): Si se activa, se lanza CalculoCancelado.
+        peso (callable): Número de elementos de cada bloque; por defecto su len(). Con lambda bloque: 1
+            cada bloque cuenta como un paso.
+
+    Yields:
+        Los mismos bloques recibidos.
+    """
+    hechos = 0
+    for bloque in bloques:
+        if cancelado is not None and cancelado.is_set():
+            raise CalculoCancelado()
+        yield bloque
+        hechos += peso(bloque)
+        if progreso is not None:
+            progreso(min(hechos / total, 1.0) if total else 1.0)
+
+def modelo_desde_archivo(ruta, dispersa=False, progreso=None, cancelado=None):
+    """
+    Construye un ModeloTransiciones leyendo un archivo de muestras CSV o binario por bloques.
+
+    Parameters:
+        ruta (str): Ruta del archivo de muestras.
+        dispersa (bool): Si es True los conteos se guardan como MatrizDispersa.
+        progreso (callable | None): Recibe la fracción de avance después de cada bloque.
+        cancelado (threading.Event | None): Permite interrumpir la lectura entre bloques.
+
+    Returns:
+        ModeloTransiciones: Modelo con todas las muestras del archivo.
+    """
+    m = canales_archivo(ruta)
+    # En un CSV cada muestra ocupa unos 2 bytes por canal ("0," o "1\n"), lo que basta para estimar el avance
+    total = len(cargar_binario(ruta)) if es_binario(ruta) else os.path.getsize(ruta) // (2 * m)
+    modelo = ModeloTransiciones(m, dispersa)
+    for estados in _seguir_bloques(leer_estados_por_bloques(ruta), total, progreso, cancelado):
+        modelo.actualizar_estados(estados)
+    return modelo
+
+def generar_bloques_aleatorios(n, m, semilla=None, tam_bloque=TAM_BLOQUE, estados=False):
+    """
+    Genera n muestras aleatorias (cada canal vale 0 o 1 con la misma probabilidad) en bloques de tamaño fijo.
+
+    Usa un np.random.Generator propio, por lo que la misma semilla produce siempre las mismas muestras,
+    y solo un bloque está en memoria a la vez.
+
+    Parameters:
+        n (int): Número total de muestras.
+        m (int): Número de canales.
+        semilla (int | None): Semilla del generador (None para una secuencia distinta en cada llamada).
+        tam_bloque (int): Número de muestras por bloque.
+        estados (bool): Si es True se generan directamente los índices de estado (uniformes entre 0 y
+            2^m - 1, la misma distribución que m bits independientes) en lugar de los bits. Las dos
+            opciones producen secuencias distintas para una misma semilla.
+
+    Yields:
+        np.ndarray: Bloques de muestras de forma (filas, m) y tipo uint8, o de índices de estado (int64).
+    """
+    generador = np.random.default_rng(semilla)
+    for inicio in range(0, n, tam_bloque):
+        filas = min(tam_bloque, n - inicio)
+        if estados:
+            yield generador.integers(0, 2 ** m, size=filas, dtype=np.int64)
+        else:
+            yield generador.integers(0, 2, size=(filas, m), dtype=np.uint8)
+
+def modelo_aleatorio(n, m, semilla=None, dispersa=False, progreso=None, cancelado=None):
+    """
+    Construye un ModeloTransiciones con n muestras aleatorias sin guardarlas, con memoria acotada por bloque.
+
+    Parameters:
+        n (int): Número de muestras.
+        m (int): Número de canales.
+        semilla (int | None): Semilla del generador.
+        dispersa (bool): Si es True los conteos se guardan como MatrizDispersa.
+        progreso (callable | None): Recibe la fracción de avance después de cada bloque.
+        cancelado (threading.Event | None): Permite interrumpir la generación entre bloques.
+
+    Returns:
+        ModeloTransiciones: Modelo con las muestras generadas.
+    """
+    modelo = ModeloTransiciones(m, dispersa)
+    for estados in _seguir_bloques(generar_bloques_aleatorios(n, m, semilla, estados=True), n, progreso, cancelado):
+        modelo.actualizar_estados(estados)
+    return modelo
+
+# Ubicación y tamaño máximo de la caché de resultados en disco
+DIRECTORIO_CACHE = os.environ.get(
+    "MATRICES_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "matrices_datos_y_estados")
+)
+MAX_BYTES_CACHE = 2 * 1024 ** 3
+
+# Se incluye en cada huella para invalidar la caché si cambia el cálculo o el formato guardado
+VERSION_CACHE = 2
+
+class CacheResultados:
+    """
+    Caché en disco de las matrices calculadas, indexada por el contenido de las muestras.
+
+    Cada resultado se guarda como un archivo .npz comprimido cuyo nombre es la huella SHA-256 de los
+    datos de entrada seguida de la de las opciones del cálculo. Al superar max_bytes se eliminan los
+    archivos usados hace más tiempo (LRU según la fecha de modificación, que se actualiza en cada
+    acierto), y del índice de archivos se quitan las firmas sin resultados guardados.
+    """
+
+    def __init__(self, directorio=DIRECTORIO_CACHE, max_bytes=MAX_BYTES_CACHE):
+        """
+        Parameters:
+            directorio (str): Carpeta donde se guardan los resultados.
+            max_bytes (int): Tamaño máximo total de la caché en bytes.
+        """
+        self.directorio = directorio
+        self.max_bytes = max_bytes
+        os.makedirs(directorio, exist_ok=True)
+        self._ruta_indice = os.path.join(directorio, "indice.json")
+
+    def huella_archivo(self, ruta, **opciones):
+        """
+        Calcula la huella del contenido de un archivo de muestras.
+
+        Para no volver a leer archivos sin cambios, la huella se recuerda junto con la ruta, el tamaño y
+        la fecha de modificación del archivo.
+
+        Parameters:
+            ruta (str): Ruta del archivo.
+            opciones: Parámetros del cálculo que también distinguen el resultado (por ejemplo dispersa).
+
+        Returns:
+            str: Huella hexadecimal.
+        """
+        firma = self._firma(ruta)
+        indice = self._leer_indice()
+        if firma not in indice:
+            resumen = hashlib.sha256()
+            with open(ruta, "rb") as archivo:
+                for trozo in iter(lambda: archivo.read(1 << 20), b""):
+                    resumen.update(trozo)
+            # Las firmas anteriores de la misma ruta corresponden a versiones que ya no existen
+            ruta_absoluta = firma.rsplit("|", 2)[0]
+            indice = {anterior: huella for anterior, huella in indice.items() if anterior.rsplit("|", 2)[0] != ruta_absoluta}
+            indice[firma] = resumen.hexdigest()
+            self._escribir_indice(indice)
+        return self._huella(indice[firma], opciones)
+
+    def huella_muestras(self, muestras, **opciones):
+        """
+        Calcula la huella de un conjunto de muestras en memoria.
+
+        Parameters:
+            muestras (list | np.ndarray): Muestras como lista de listas de bits o arreglo (n, m).
+            opciones: Parámetros del cálculo que también distinguen el resultado.
+
+        Returns:
+            str: Huella hexadecimal.
+        """
+        arreglo = np.ascontiguousarray(muestras, dtype=np.uint8)
+        resumen = hashlib.sha256(str(arreglo.shape).encode())
+        resumen.update(arreglo.tobytes())
+        return self._huella(resumen.hexdigest(), opciones)
+
+    @medido("cache_lectura")
+    def obtener(self, clave):
+        """
+        Busca un resultado en la caché.
+
+        Parameters:
+            clave (str): Huella de los datos de entrada.
+
+        Returns:
+            tuple | None: Las seis matrices guardadas, o None si no están en la caché o no se pueden
+                leer (un archivo dañado se elimina para volver a calcularlo).
+        """
+        ruta = self._ruta(clave)
+        try:
+            with np.load(ruta) as datos:
+                matrices = tuple(self._leer_matriz(datos, i) for i in range(int(datos["cantidad"])))
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # Archivo truncado o dañado (BadZipFile, EOFError, zlib.error, ...): cuenta como fallo
+            try:
+                os.remove(ruta)
+            except OSError:
+                pass
+            return None
+        try:
+            os.utime(ruta)  # Marca el resultado como usado recientemente
+        except OSError:
+            pass
+        return matrices
+
+    @medido("cache_escritura")
+    def guardar(self, clave, matrices):
+        """
+        Guarda un resultado en la caché y elimina los más antiguos si se supera el tamaño máximo.
+
+        Parameters:
+            clave (str): Huella de los datos de entrada.
+            matrices (tuple): Matrices (np.ndarray o MatrizDispersa) a guardar.
+        """
+        arreglos = {"cantidad": np.array(len(matrices))}
+        for i, matriz in enumerate(matrices):
+            if isinstance(matriz, MatrizDispersa):
+                arreglos[f"filas_{i}"] = matriz.filas
+                arreglos[f"columnas_{i}"] = matriz.columnas
+                arreglos[f"valores_{i}"] = matriz.valores
+                arreglos[f"forma_{i}"] = np.array(matriz.shape)
+            else:
+                arreglos[f"matriz_{i}"] = matriz
+
+        # Se escribe en un archivo temporal para no dejar resultados a medias
+        temporal = self._ruta(clave) + ".tmp.npz"
+        try:
+            np.savez_compressed(temporal, **arreglos)
+            os.replace(temporal, self._ruta(clave))
+        except OSError:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            raise
+        self._expulsar()
+
+    @staticmethod
+    def _firma(ruta):
+        info = os.stat(ruta)
+        return f"{os.path.abspath(ruta)}|{info.st_size}|{info.st_mtime_ns}"
+
+    def _huella(self, huella_datos, opciones):
+        # La huella de los datos queda al inicio del nombre para saber qué archivos siguen en la caché
+        texto = json.dumps([VERSION_CACHE, sorted(opciones.items())])
+        return f"{huella_datos}_{hashlib.sha256(texto.encode()).hexdigest()}"
+
+    def _ruta(self, clave):
+        return os.path.join(self.directorio, f"{clave}.npz")
+
+    @staticmethod
+    def _leer_matriz(datos, i):
+        if f"matriz_{i}" in datos:
+            return datos[f"matriz_{i}"]
+        return MatrizDispersa(datos[f"filas_{i}"], datos[f"columnas_{i}"], datos[f"valores_{i}"], tuple(datos[f"forma_{i}"]))
+
+    def _expulsar(self):
+        archivos = []
+        for nombre in os.listdir(self.directorio):
+            if nombre.endswith(".npz"):
+                info = os.stat(os.path.join(self.directorio, nombre))
+                archivos.append((info.st_mtime_ns, info.st_size, nombre))
+        total = sum(tamano for _, tamano, _ in archivos)
+        conservados = set()
+        for _, tamano, nombre in sorted(archivos):
+            if total <= self.max_bytes:
+                conservados.add(nombre)
+                continue
+            os.remove(os.path.join(self.directorio, nombre))
+            total -= tamano
+
+        # Del índice se quitan las firmas de archivos que cambiaron o cuyos resultados ya no están
+        huellas = {nombre.split("_")[0] for nombre in conservados}
+        indice = self._leer_indice()
+        vigente = {firma: huella for firma, huella in indice.items() if huella in huellas and self._firma_vigente(firma)}
+        if len(vigente) < len(indice):
+            self._escribir_indice(vigente)
+
+    def _firma_vigente(self, firma):
+        ruta = firma.rsplit("|", 2)[0]
+        try:
+            return self._firma(ruta) == firma
+        except OSError:
+            return False
+
+    def _leer_indice(self):
+        try:
+            with open(self._ruta_indice) as archivo:
+                return json.load(archivo)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _escribir_indice(self, indice):
+        temporal = self._ruta_indice + ".tmp"
+        with open(temporal, "w") as archivo:
+            json.dump(indice, archivo)
+        os.replace(temporal, self._ruta_indice)
+
+def procesar_archivo_con_cache(ruta, cache=None, dispersa=False, tipo=np.float64, progreso=None, cancelado=None):
+    """
+    Calcula las matrices de un archivo de muestras (CSV o binario) reutilizando el resultado guardado
+    si el contenido no cambió.
+
+    Parameters:
+        ruta (str): Ruta del archivo de muestras.
+        cache (CacheResultados | None): Caché a usar; si es None se usa la caché por defecto.
+        dispersa (bool): Si es True las matrices se calculan como MatrizDispersa.
+        tipo (np.dtype): np.float64 o np.float32; los resultados de cada tipo se guardan por separado.
+        progreso (callable | None): Recibe la fracción de avance del cálculo.
+        cancelado (threading.Event | None): Permite interrumpir el cálculo entre bloques.
+
+    La caché es opcional: si no se puede crear, leer o escribir (carpeta sin permisos, disco lleno)
+    las matrices se calculan y devuelven igual, sin guardarlas.
+
+    Returns:
+        tuple: Las seis matrices en el mismo orden que procesamiento_datos, seguidas de None en lugar
+            de las muestras almacenadas.
+    """
+    try:
+        cache = cache or CacheResultados()
+        clave = cache.huella_archivo(ruta, dispersa=dispersa, tipo=np.dtype(tipo).name)
+        matrices = cache.obtener(clave)
+        INSTRUMENTACION.contar("cache_aciertos" if matrices is not None else "cache_fallos")
+    except OSError:
+        cache = matrices = None
+        INSTRUMENTACION.contar("cache_errores")
+    if matrices is None:
+        matrices = modelo_desde_archivo(ruta, dispersa, progreso, cancelado).matrices(tipo)
+        if cache is not None:
+            try:
+                cache.guardar(clave, matrices)
+            except OSError:
+                INSTRUMENTACION.contar("cache_errores")
+    return matrices + (None,)
+
+# Tamaño mínimo (en bytes) de cada parte cuando un archivo grande se reparte entre varios procesos
+TAM_MIN_PARTE = 8 * 1024 ** 2
+
+def _expandir_rutas(rutas):
+    """
+    Reemplaza cada carpeta de la lista por los archivos de muestras (.csv o binarios) que contiene, en
+    orden alfabético.
+    """
+    archivos = []
+    for ruta in rutas:
+        if os.path.isdir(ruta):
+            archivos += sorted(
+                os.path.join(ruta, nombre) for nombre in os.listdir(ruta)
+                if nombre.lower().endswith((".csv", EXTENSION_BINARIA))
+            )
+        else:
+            archivos.append(ruta)
+    return archivos
+
+def _cota_muestras(ruta, inicio, fin, m):
+    """
+    Cota superior del número de muestras que empiezan en el rango de bytes [inicio, fin) de un archivo.
+
+    Una fila de un CSV ocupa al menos 2 bytes por canal ("0," o "1\n") y una fila binaria ceil(m / 8).
+    """
+    return (fin - inicio) // ((m + 7) // 8 if es_binario(ruta) else 2 * m) + 1
+
+def _vistas_conteos(buffer, m, tipo):
+    """
+    Interpreta un buffer de memoria compartida como los conteos densos de un ModeloTransiciones.
+
+    Returns:
+        tuple: (conteo_diagonal de forma (1, 2^m), dict con las tres matrices de 2^m x 2^m).
+    """
+    tam = 2 ** m
+    datos = np.ndarray((tam + 3 * tam * tam,), dtype=tipo, buffer=buffer)
+    matrices = datos[tam:].reshape(3, tam, tam)
+    return datos[:tam].reshape(1, tam), dict(zip(ModeloTransiciones.NOMBRES_CONTEOS, matrices))
+
+# Acumulador persistente de cada proceso del pool en procesar_en_paralelo: (espacio, memoria, tipo, muestras contadas)
+_ACUMULADOR_PROCESO = None
+
+def _iniciar_proceso(espacios, nombres_memoria, tipo):
+    """
+    Inicializa un proceso del pool de procesar_en_paralelo tomando uno de los acumuladores compartidos libres.
+    """
+    global _ACUMULADOR_PROCESO
+    from multiprocessing import shared_memory
+
+    with espacios.get_lock():
+        espacio = espacios.value
+        espacios.value += 1
+    memoria = shared_memory.SharedMemory(name=nombres_memoria[espacio])
+    _ACUMULADOR_PROCESO = [espacio, memoria, tipo, 0]
+
+def _contar_parte(ruta, inicio, fin, m, dispersa):
+    """
+    Cuenta las transiciones de una parte de un archivo en un proceso del pool.
+
+    En modo denso los conteos de todas las partes que atiende un proceso se suman en su acumulador de
+    memoria compartida (ver _iniciar_proceso), sin enlazar partes distintas entre sí, y solo se
+    devuelven los datos de frontera de la parte. En modo disperso se devuelve el modelo completo de la
+    parte, cuyo tamaño depende del número de muestras y no de 2^m x 2^m.
+
+    Returns:
+        ModeloTransiciones | tuple: El modelo de la parte (disperso) o (espacio del acumulador, n,
+            estado_primero, estado_penultimo, estado_ultimo).
+    """
+    if dispersa:
+        modelo = ModeloTransiciones(m, dispersa=True)
+        for estados in leer_estados_por_bloques(ruta, inicio=inicio, fin=fin):
+            modelo.actualizar_estados(estados)
+        return modelo
+
+    espacio, memoria, tipo, contadas = _ACUMULADOR_PROCESO
+    # Un modelo nuevo sobre el mismo acumulador: la parte no se enlaza con la anterior del proceso
+    modelo = ModeloTransiciones.desde_conteos(m, *_vistas_conteos(memoria.buf, m, tipo), n=contadas)
+    for estados in leer_estados_por_bloques(ruta, inicio=inicio, fin=fin):
+        modelo.actualizar_estados(estados)
+    n = modelo.n - contadas
+    _ACUMULADOR_PROCESO[3] = modelo.n
+    frontera = (espacio, n, modelo.estado_primero, modelo.estado_penultimo, modelo.estado_ultimo)
+    del modelo  # No deja vistas de la memoria compartida fuera del acumulador
+    return frontera
+
+@medido("procesamiento_paralelo")
+def procesar_en_paralelo(rutas, procesos=None, dispersa=False):
+    """
+    Cuenta las transiciones de varios archivos CSV o binarios (o carpetas de archivos) en paralelo y las combina.
+
+    Cada archivo se reparte en partes de al menos TAM_MIN_PARTE bytes que se procesan en un
+    ProcessPoolExecutor. Las partes de un mismo archivo se combinan enlazando la última muestra de una
+    con la primera de la siguiente; los archivos distintos se combinan como grabaciones independientes.
+
+    En modo denso cada proceso reserva al iniciar un acumulador de memoria compartida y suma en él
+    todas las partes que atiende; solo devuelve los estados de frontera de cada parte, con los que el
+    proceso principal agrega los enlaces entre partes contiguas. Al final se combinan los acumuladores,
+    uno por proceso. La memoria compartida es, por tanto, procesos x (2^m + 3 * 4^m) x tamaño del tipo
+    entero (el más pequeño que admite n * m de todas las entradas, normalmente 4 bytes), más los conteos
+    del resultado: con m = 12 son unos 200 MB por proceso, sin importar el número de archivos o partes.
+
+    Parameters:
+        rutas (list): Archivos de muestras (CSV o binarios) o carpetas que los contienen.
+        procesos (int | None): Número de procesos (None para usar todos los núcleos).
+        dispersa (bool): Si es True los conteos se calculan como MatrizDispersa.
+
+    Returns:
+        ModeloTransiciones: Modelo con los conteos combinados de todos los archivos.
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing import shared_memory
+
+    archivos = _expandir_rutas(rutas)
+    if not archivos:
+        raise ValueError("No hay archivos para procesar.")
+    m = canales_archivo(archivos[0])
+    procesos = procesos or os.cpu_count() or 1
+
+    # Partes (ruta, inicio, fin, contigua a la anterior) en el orden en que se deben combinar
+    partes = []
+    for ruta in archivos:
+        if canales_archivo(ruta) != m:
+            raise ValueError(f"El archivo {ruta} no tiene {m} canales.")
+        tam_archivo = os.path.getsize(ruta)
+        cantidad = max(1, min(procesos, tam_archivo // TAM_MIN_PARTE))
+        limites = [tam_archivo * k // cantidad for k in range(cantidad + 1)]
+        partes += [(ruta, limites[k], limites[k + 1], k > 0) for k in range(cantidad)]
+    procesos = min(procesos, len(partes))
+    total = ModeloTransiciones(m, dispersa)
+
+    if dispersa:
+        pendientes = deque()
+        # Se limita el número de partes en curso para acotar los modelos que esperan ser combinados
+        with ProcessPoolExecutor(max_workers=procesos) as pool:
+            try:
+                for ruta, inicio, fin, contigua in partes:
+                    pendientes.append((pool.submit(_contar_parte, ruta, inicio, fin, m, True), contigua))
+                    if len(pendientes) >= 2 * procesos:
+                        futuro, anterior_contigua = pendientes.popleft()
+                        total.combinar(futuro.result(), anterior_contigua)
+                while pendientes:
+                    futuro, contigua = pendientes.popleft()
+                    total.combinar(futuro.result(), contigua)
+            finally:
+                for futuro, _ in pendientes:
+                    futuro.cancel()
+        return total
+
+    # Cota de cualquier celda de un acumulador, aunque un solo proceso cuente todas las partes
+    tipo = np.dtype(_tipo_conteo(sum(_cota_muestras(ruta, inicio, fin, m) for ruta, inicio, fin, _ in partes) * m))
+    tam = 2 ** m
+    memorias = []
+    try:
+        for _ in range(procesos):
+            memorias.append(shared_memory.SharedMemory(create=True, size=(tam + 3 * tam * tam) * tipo.itemsize))
+        espacios = multiprocessing.Value("i", 0)
+        iniciar = (espacios, [memoria.name for memoria in memorias], tipo)
+        with ProcessPoolExecutor(max_workers=procesos, initializer=_iniciar_proceso, initargs=iniciar) as pool:
+            futuros = [(pool.submit(_contar_parte, ruta, inicio, fin, m, False), contigua) for ruta, inicio, fin, contigua in partes]
+            try:
+                muestras_espacio = [0] * procesos
+                for futuro, contigua in futuros:
+                    espacio, n, primero, penultimo, ultimo = futuro.result()
+                    if n:
+                        muestras_espacio[espacio] += n
+                        total._enlazar(n, primero, penultimo, ultimo, contigua)
+            finally:
+                for futuro, _ in futuros:
+                    futuro.cancel()
+
+        # Una suma por proceso: los conteos de todas sus partes ya están juntos en su acumulador
+        for memoria, n in zip(memorias, muestras_espacio):
+            if n:
+                conteo_diagonal, conteos = _vistas_conteos(memoria.buf, m, tipo)
+                total._sumar_conteos(dict(conteos, diagonal=conteo_diagonal), n * m)
+                del conteo_diagonal, conteos
+    finally:
+        for memoria in memorias:
+            memoria.close()
+            memoria.unlink()
+    return total
+
+@medido("marginalizar")
+def marginalizar(matriz, indices):
+    """
+    Realiza la marginalización de una matriz dado un conjunto de índices.
+
+    Parameters:
+        matriz (np.ndarray | MatrizDispersa): Matriz a marginalizar.
+        indices (list): Lista de índices de columnas a marginalizar.
+
+    Returns:
+        np.ndarray | MatrizDispersa: Matriz marginalizada (una columna de tam filas si la entrada es dispersa).
+    """
+    if matriz is None:
+        return np.zeros((0,))  # Retorna una matriz vacía si la matriz es None
+    if isinstance(matriz, MatrizDispersa):
+        # Cada columna cuenta tantas veces como aparezca en indices, igual que matriz[:, indices]
+        columnas_unicas, repeticiones = np.unique(np.asarray(indices, dtype=np.int64) % matriz.shape[1], return_counts=True)
+        posicion = np.searchsorted(columnas_unicas, matriz.columnas)
+        seleccion = posicion < len(columnas_unicas)
+        seleccion[seleccion] = columnas_unicas[posicion[seleccion]] == matriz.columnas[seleccion]
+        valores = matriz.valores[seleccion] * repeticiones[posicion[seleccion]]
+        filas = matriz.filas[seleccion]
+        return MatrizDispersa(filas, np.zeros_like(filas), valores, (matriz.shape[0], 1)) / 2
+    return np.sum(matriz[:, indices], axis=1) / 2  # Dividimos entre 2 para ajustar según la lógica mencionada
+
+@medido("normalizar")
+def normalizar(matriz, tipo=None):
+    """
+    Normaliza una matriz dividiendo cada fila por la suma de sus elementos.
+
+    También acepta conteos enteros (por ejemplo los de ModeloTransiciones.conteos()), de modo que las
+    probabilidades se calculan solo al leerlas.
+
+    Parameters:
+        matriz (np.ndarray | MatrizDispersa): Matriz a normalizar.
+        tipo (np.dtype | None): np.float32 o np.float64 para el resultado; None conserva el tipo de
+            punto flotante de la entrada (float64 si la entrada es entera).
+
+    Returns:
+        np.ndarray | MatrizDispersa: Matriz normalizada, del mismo tipo que la entrada.
+    """
+    if isinstance(matriz, MatrizDispersa):
+        # Las sumas se calculan solo sobre las filas que tienen celdas almacenadas
+        _, fila_de_celda = np.unique(matriz.filas, return_inverse=True)
+        suma_filas = np.bincount(fila_de_celda.ravel(), weights=matriz.valores)
+        suma_filas[suma_filas == 0] = 1
+        valores = np.divide(matriz.valores, suma_filas[fila_de_celda.ravel()], dtype=tipo or np.result_type(matriz.valores, np.float32))
+        return MatrizDispersa(matriz.filas, matriz.columnas, valores, matriz.shape)
+
+    suma_filas = np.sum(matriz, axis=1, keepdims=True)
+
+    # Reemplazar ceros en la suma para evitar divisiones por cero
+    suma_filas[suma_filas == 0] = 1
+
+    # Normalizar la matriz
+    if tipo is not None:
+        return np.divide(matriz, suma_filas, dtype=tipo)
+    matriz_normalizada = matriz / suma_filas
+
+    return matriz_normalizada
+
+@medido("marginalizar_y_normalizar")
+def marginalizar_y_normalizar(matriz, indices_filas, indices_columnas):
+    """
+    Realiza la marginalización y normalización de una matriz dado un conjunto de índices de filas y columnas.
+
+    Parameters:
+        matriz (np.ndarray | MatrizDispersa): Matriz a procesar.
+        indices_filas (list): Lista de índices de filas a marginalizar.
+        indices_columnas (list): Lista de índices de columnas a marginalizar.
+
+    Returns:
+        np.ndarray | MatrizDispersa: Matriz resultante después de la marginalización y normalización.
+    """
+    matriz_marginalizada = marginalizar(matriz, indices_columnas)
+    matriz_normalizada = normalizar(matriz_marginalizada.reshape(-1, 2 ** len(indices_filas)))
+    return matriz_normalizada.reshape(-1, 2 ** len(indices_columnas))
+
+def _numero_canales(tam):
+    """
+    Devuelve el número de canales m tal que tam == 2^m.
+    """
+    m = int(tam).bit_length() - 1
+    if tam != 2 ** m:
+        raise ValueError(f"La dimensión {tam} no es una potencia de 2.")
+    return m
+
+def _orden_ejes(canales):
+    """
+    Permutación que lleva los ejes conservados (en orden ascendente) al orden pedido en canales.
+    """
+    ordenados = sorted(canales)
+    return [ordenados.index(canal) for canal in canales]
+
+@medido("marginalizar_canales")
+def marginalizar_canales(matriz, canales_presente, canales_futuro):
+    """
+    Marginaliza una matriz de 2^m x 2^m sobre cualquier subconjunto de canales del presente y del futuro.
+
+    La matriz se ve como un tensor de forma (2,)*m x (2,)*m y los canales eliminados se reducen con una
+    sola suma sobre sus ejes. Los canales futuros eliminados se suman y los presentes eliminados se
+    promedian (se divide entre 2 por cada uno), como en marginalizar. El canal 0 es el bit más
+    significativo del índice de estado.
+
+    Parameters:
+        matriz (np.ndarray | MatrizDispersa): Matriz con filas de estado presente y columnas de estado futuro.
+        canales_presente (list): Canales del presente (filas) que se conservan, en el orden deseado.
+        canales_futuro (list): Canales del futuro (columnas) que se conservan, en el orden deseado.
+
+    Returns:
+        np.ndarray | MatrizDispersa: Matriz de 2^len(canales_presente) x 2^len(canales_futuro).
+    """
+    m_presente = _numero_canales(matriz.shape[0])
+    m_futuro = _numero_canales(matriz.shape[1])
+    canales_presente = list(canales_presente)
+    canales_futuro = list(canales_futuro)
+    if set(canales_presente) - set(range(m_presente)) or set(canales_futuro) - set(range(m_futuro)):
+        raise ValueError("Los canales a conservar deben estar entre 0 y m - 1.")
+    factor = 2 ** (m_presente - len(set(canales_presente)))
+    forma = (2 ** len(canales_presente), 2 ** len(canales_futuro))
+
+    if isinstance(matriz, MatrizDispersa):
+        # Se extraen los bits conservados de cada celda y se reagrupan en los nuevos índices
+        def reindexar(indices, m, canales):
+            desplazamientos = m - 1 - np.asarray(canales, dtype=np.int64)
+            pesos = np.left_shift(1, np.arange(len(canales) - 1, -1, -1, dtype=np.int64))
+            return ((indices[:, None] >> desplazamientos) & 1) @ pesos
+
+        return MatrizDispersa(
+            reindexar(matriz.filas, m_presente, canales_presente),
+            reindexar(matriz.columnas, m_futuro, canales_futuro),
+            matriz.valores / factor,
+            forma,
+        )
+
+    tensor = np.asarray(matriz).reshape((2,) * (m_presente + m_futuro))
+    ejes = tuple(c for c in range(m_presente) if c not in canales_presente) + tuple(
+        m_presente + c for c in range(m_futuro) if c not in canales_futuro
+    )
+    reducido = tensor.sum(axis=ejes)
+    orden = _orden_ejes(canales_presente) + [len(canales_presente) + eje for eje in _orden_ejes(canales_futuro)]
+    return reducido.transpose(orden).reshape(forma) / factor
+
+# Memoria máxima de los tensores intermedios que recuerda RedMarginales
+MAX_BYTES_MARGINALES = 256 * 1024 ** 2
+
+def familia_subconjuntos(m, minimo=1, maximo=None):
+    """
+    Genera todos los pares (canales_presente, canales_futuro) de subconjuntos de m canales.
+
+    Parameters:
+        m (int): Número de canales.
+        minimo (int): Tamaño mínimo de cada subconjunto.
+        maximo (int | None): Tamaño máximo de cada subconjunto (m si es None).
+
+    Yields:
+        tuple: (canales_presente, canales_futuro), cada uno como tupla de canales en orden ascendente.
+    """
+    maximo = m if maximo is None else maximo
+    subconjuntos = [
+        tuple(canal for canal in range(m) if mascara >> (m - 1 - canal) & 1)
+        for mascara in range(2 ** m)
+    ]
+    subconjuntos = [canales for canales in subconjuntos if minimo <= len(canales) <= maximo]
+    for canales_presente in subconjuntos:
+        for canales_futuro in subconjuntos:
+            yield canales_presente, canales_futuro
+
+def _bytes_tensor(tensor):
+    if isinstance(tensor, MatrizDispersa):
+        return tensor.filas.nbytes + tensor.columnas.nbytes + tensor.valores.nbytes
+    return tensor.nbytes
+
+class RedMarginales:
+    """
+    Calcula muchas marginales de una misma matriz recorriendo el retículo de subconjuntos de canales.
+
+    Cada marginal se obtiene de la marginal ya reducida más pequeña que contiene sus canales (un
+    "padre" del retículo) en lugar de partir de la matriz completa de 2^m x 2^m. Las marginales
+    intermedias se guardan con los canales en orden ascendente, como tensores de forma (2,)*k, en una
+    caché LRU limitada a max_bytes. Los resultados son los mismos que los de marginalizar_canales.
+    """
+
+    def __init__(self, matriz, max_bytes=MAX_BYTES_MARGINALES):
+        """
+        Parameters:
+            matriz (np.ndarray | MatrizDispersa): Matriz con filas de estado presente y columnas de estado futuro.
+            max_bytes (int): Memoria máxima de las marginales intermedias guardadas.
+        """
+        self.matriz = matriz
+        self.m_presente = _numero_canales(matriz.shape[0])
+        self.m_futuro = _numero_canales(matriz.shape[1])
+        self.max_bytes = max_bytes
+        self.dispersa = isinstance(matriz, MatrizDispersa)
+        self._raiz = matriz if self.dispersa else np.asarray(matriz).reshape((2,) * (self.m_presente + self.m_futuro))
+        self._cache = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _padre(self, presente, futuro):
+        """
+        Devuelve la marginal guardada más pequeña que contiene los canales pedidos (o la matriz completa).
+        """
+        # Primero se buscan los padres inmediatos (un canal más), que son los más pequeños posibles
+        for canal in range(self.m_presente):
+            clave = (presente | {canal}, futuro)
+            if canal not in presente and clave in self._cache:
+                self._cache.move_to_end(clave)
+                return clave[0], clave[1], self._cache[clave]
+        for canal in range(self.m_futuro):
+            clave = (presente, futuro | {canal})
+            if canal not in futuro and clave in self._cache:
+                self._cache.move_to_end(clave)
+                return clave[0], clave[1], self._cache[clave]
+
+        # Luego las marginales que conservan todos los canales de uno de los lados
+        todos_presente, todos_futuro = frozenset(range(self.m_presente)), frozenset(range(self.m_futuro))
+        for clave in ((presente, todos_futuro), (todos_presente, futuro)):
+            if clave in self._cache:
+                self._cache.move_to_end(clave)
+                return clave[0], clave[1], self._cache[clave]
+
+        mejor = None
+        for clave in self._cache:
+            if presente <= clave[0] and futuro <= clave[1]:
+                if mejor is None or len(clave[0]) + len(clave[1]) < len(mejor[0]) + len(mejor[1]):
+                    mejor = clave
+        if mejor is None:
+            return frozenset(range(self.m_presente)), frozenset(range(self.m_futuro)), self._raiz
+        self._cache.move_to_end(mejor)
+        return mejor[0], mejor[1], self._cache[mejor]
+
+    def _guardar(self, clave, tensor):
+        tamano = _bytes_tensor(tensor)
+        if tamano > self.max_bytes:
+            return
+        self._cache[clave] = tensor
+        self._bytes += tamano
+        while self._bytes > self.max_bytes:
+            _, descartado = self._cache.popitem(last=False)
+            self._bytes -= _bytes_tensor(descartado)
+
+    def _reducida(self, presente, futuro):
+        """
+        Devuelve la marginal de los conjuntos de canales dados, con los canales en orden ascendente.
+        """
+        clave = (presente, futuro)
+        with self._lock:
+            if clave in self._cache:
+                self._cache.move_to_end(clave)
+                return self._cache[clave]
+            presente_padre, futuro_padre, padre = self._padre(presente, futuro)
+        todos_futuro = frozenset(range(self.m_futuro))
+        if padre is self._raiz and len(presente) < self.m_presente and futuro != todos_futuro:
+            # Se pasa por la marginal que conserva todo el futuro, que comparten los pares con el mismo presente
+            presente_padre, futuro_padre = presente, todos_futuro
+            padre = self._reducida(presente, todos_futuro)
+        orden_presente, orden_futuro = sorted(presente_padre), sorted(futuro_padre)
+
+        if self.dispersa:
+            # Las posiciones de los canales conservados dentro de la marginal padre
+            reducida = marginalizar_canales(
+                padre,
+                [orden_presente.index(canal) for canal in sorted(presente)],
+                [orden_futuro.index(canal) for canal in sorted(futuro)],
+            )
+        else:
+            ejes = tuple(eje for eje, canal in enumerate(orden_presente) if canal not in presente) + tuple(
+                len(orden_presente) + eje for eje, canal in enumerate(orden_futuro) if canal not in futuro
+            )
+            reducida = padre.sum(axis=ejes) if ejes else padre
+            if len(presente) < len(presente_padre):
+                reducida = reducida / 2 ** (len(presente_padre) - len(presente))
+        with self._lock:
+            self._guardar(clave, reducida)
+        return reducida
+
+    def marginal(self, canales_presente, canales_futuro):
+        """
+        Marginaliza la matriz a los canales dados, igual que marginalizar_canales.
+
+        Parameters:
+            canales_presente (list): Canales del presente (filas) que se conservan, en el orden deseado.
+            canales_futuro (list): Canales del futuro (columnas) que se conservan, en el orden deseado.
+
+        Returns:
+            np.ndarray | MatrizDispersa: Matriz de 2^len(canales_presente) x 2^len(canales_futuro).
+        """
+        canales_presente = list(canales_presente)
+        canales_futuro = list(canales_futuro)
+        if len(set(canales_presente)) < len(canales_presente) or len(set(canales_futuro)) < len(canales_futuro):
+            raise ValueError("Los canales a conservar no pueden repetirse.")
+        if set(canales_presente) - set(range(self.m_presente)) or set(canales_futuro) - set(range(self.m_futuro)):
+            raise ValueError("Los canales a conservar deben estar entre 0 y m - 1.")
+        reducida = self._reducida(frozenset(canales_presente), frozenset(canales_futuro))
+        forma = (2 ** len(canales_presente), 2 ** len(canales_futuro))
+
+        if self.dispersa:
+            if canales_presente == sorted(canales_presente) and canales_futuro == sorted(canales_futuro):
+                return reducida.copy()
+            return marginalizar_canales(reducida, _orden_ejes(canales_presente), _orden_ejes(canales_futuro))
+        orden = _orden_ejes(canales_presente) + [len(canales_presente) + eje for eje in _orden_ejes(canales_futuro)]
+        # Se copia para que modificar el resultado no altere la caché
+        return np.array(reducida.transpose(orden).reshape(forma))
+
+    def marginal_normalizada(self, canales_presente, canales_futuro, tipo=None):
+        """
+        Marginaliza la matriz a los canales dados y normaliza cada fila.
+        """
+        return normalizar(self.marginal(canales_presente, canales_futuro), tipo)
+
+    @medido("marginales_en_lote")
+    def calcular(self, familia, normalizada=True, progreso=None, cancelado=None):
+        """
+        Calcula las marginales de una familia de pares de subconjuntos de canales.
+
+        Las marginales se calculan de los subconjuntos más grandes a los más pequeños, de modo que cada
+        una se obtiene de un padre ya reducido que difiere en pocos canales.
+
+        Parameters:
+            familia (iterable): Pares (canales_presente, canales_futuro), por ejemplo de familia_subconjuntos().
+            normalizada (bool): Si se normaliza cada fila del resultado.
+            progreso (callable | None): Recibe la fracción de avance, entre 0 y 1.
+            cancelado (threading.Event | None): Si se activa, se lanza CalculoCancelado.
+
+        Returns:
+            dict: Marginal de cada par, con las claves (tuple(canales_presente), tuple(canales_futuro)).
+        """
+        familia = [(tuple(presente), tuple(futuro)) for presente, futuro in familia]
+        orden = sorted(familia, key=lambda par: -(len(par[0]) + len(par[1])))
+        resultados = {}
+        for presente, futuro in _seguir_bloques(orden, len(orden), progreso, cancelado, peso=lambda par: 1):
+            resultado = self.marginal(presente, futuro)
+            resultados[presente, futuro] = normalizar(resultado) if normalizada else resultado
+        return {par: resultados[par] for par in familia}
+
+# Nombres de las matrices en el orden en que las devuelve procesamiento_datos
+NOMBRES_MATRICES = (
+    'EstadoCanalF',
+    'EstadoEstadoF',
+    'EstadoCanalP',
+    'EstadoEstadoP',
+    'EstadoCanalF_aux',
+    'EstadoEstadoF_aux',
+)
+
+def _leer_canales(texto):
+    """
+    Convierte una lista de canales separados por comas ("0,2") en una lista de enteros.
+    """
+    return [int(canal) for canal in texto.split(",") if canal.strip()]
+
+# Formatos de exportación y celdas que se formatean o escriben por bloque en CSV y Parquet
+FORMATOS_EXPORTACION = ("npz", "npy", "csv", "parquet")
+CELDAS_BLOQUE_EXPORTACION = 1_000_000
+
+def _arreglo_exportable(datos, tipo):
+    """
+    Convierte unas muestras en memoria o una matriz densa en un np.ndarray, reduciendo a tipo los valores flotantes.
+
+    Las MuestrasEmpaquetadas no pasan por aquí: se exportan por bloques (ver _escribir_npy_por_bloques).
+    """
+    arreglo = np.asarray(datos)
+    if tipo is not None and arreglo.dtype.kind == "f":
+        arreglo = arreglo.astype(tipo, copy=False)
+    return arreglo
+
+def _tabla_exportable(nombre, datos, tipo):
+    """
+    Describe una matriz o unas muestras como una tabla de columnas que se puede leer por bloques.
 
-def procesamiento_datos(n, m, muestras):
+    Las matrices dispersas se exportan en coordenadas (fila, columna, valor) para no materializar la
+    matriz de 2^m x 2^m; las densas y las muestras, con una columna por estado futuro o por canal.
+
+    Returns:
+        tuple: (nombres de las columnas, número de filas, función (inicio, fin) -> lista de columnas).
     """
-    Calcula las matrices de transición para el canal y el estado a partir de las muestras dadas.
+    if isinstance(datos, MatrizDispersa):
+        valores = _arreglo_exportable(datos.valores, tipo)
+        return ["fila", "columna", "valor"], len(valores), lambda inicio, fin: [
+            datos.filas[inicio:fin], datos.columnas[inicio:fin], valores[inicio:fin]
+        ]
+
+    forma = datos.shape if hasattr(datos, "shape") else np.shape(datos)
+    filas, columnas = (forma[0], int(np.prod(forma[1:]))) if len(forma) else (0, 0)
+    prefijo = "canal" if nombre == "muestras" else "F"
+
+    def leer(inicio, fin):
+        bloque = _arreglo_exportable(ventana_datos(datos, inicio, fin, 0, columnas), tipo)
+        return list(bloque.T)
+
+    return [f"{prefijo}{j}" for j in range(columnas)], filas, leer
+
+def _formato_columna(columna, decimales):
+    """
+    Devuelve el formato % de una columna: entero, con decimales fijos o con los dígitos justos para no perder precisión.
+    """
+    if columna.dtype.kind in "iub":
+        return "%d"
+    if decimales is not None:
+        return f"%.{decimales}f"
+    return "%.9g" if columna.dtype == np.float32 else "%.17g"
+
+def _escribir_csv(ruta, tabla, comprimir, decimales, cancelado=None):
+    """
+    Escribe una tabla en CSV formateando cada bloque de filas con una sola operación % sobre todos sus valores.
+    """
+    import gzip
+    nombres, total, leer = tabla
+    filas_bloque = max(1, CELDAS_BLOQUE_EXPORTACION // max(len(nombres), 1))
+    abrir = gzip.open if comprimir else open
+    with abrir(ruta, "wt", newline="") as archivo:
+        archivo.write(",".join(nombres) + "\n")
+        for inicio in range(0, total, filas_bloque):
+            if cancelado is not None and cancelado.is_set():
+                raise CalculoCancelado()
+            columnas = leer(inicio, min(inicio + filas_bloque, total))
+            formato = ",".join(_formato_columna(columna, decimales) for columna in columnas) + "\n"
+            if len({columna.dtype for columna in columnas}) == 1:
+                valores = np.column_stack(columnas).ravel().tolist()
+            else:
+                valores = [valor for fila in zip(*(columna.tolist() for columna in columnas)) for valor in fila]
+            archivo.write((formato * len(columnas[0])) % tuple(valores))
+
+def _escribir_npz(ruta, arreglos, comprimir, cancelado=None):
+    """
+    Escribe un .npz como np.savez (o np.savez_compressed), pero copiando cada arreglo por bloques.
+
+    np.savez convierte cada arreglo completo a bytes antes de escribirlo; aquí se escriben a lo sumo
+    CELDAS_BLOQUE_EXPORTACION valores a la vez, de modo que un np.memmap se lee del disco de a poco.
+    """
+    import zipfile
+    compresion = zipfile.ZIP_DEFLATED if comprimir else zipfile.ZIP_STORED
+    with zipfile.ZipFile(ruta, "w", compression=compresion, allowZip64=True) as archivo_zip:
+        for nombre, arreglo in arreglos.items():
+            arreglo = np.asarray(arreglo, order="C")
+            with archivo_zip.open(f"{nombre}.npy", "w", force_zip64=True) as archivo:
+                np.lib.format.write_array_header_1_0(archivo, np.lib.format.header_data_from_array_1_0(arreglo))
+                valores = arreglo.reshape(-1)
+                for inicio in range(0, valores.size, CELDAS_BLOQUE_EXPORTACION):
+                    if cancelado is not None and cancelado.is_set():
+                        raise CalculoCancelado()
+                    archivo.write(valores[inicio:inicio + CELDAS_BLOQUE_EXPORTACION].tobytes())
+
+def _escribir_npy_por_bloques(ruta, muestras, cancelado=None):
+    """
+    Escribe unas MuestrasEmpaquetadas en un .npy de forma (n, m) y tipo uint8, desempaquetando un bloque a la vez.
+    """
+    destino = np.lib.format.open_memmap(ruta, mode="w+", dtype=np.uint8, shape=muestras.shape)
+    try:
+        filas_bloque = max(1, CELDAS_BLOQUE_EXPORTACION // max(muestras.m, 1))
+        for inicio in range(0, len(muestras), filas_bloque):
+            if cancelado is not None and cancelado.is_set():
+                raise CalculoCancelado()
+            destino[inicio:inicio + filas_bloque] = muestras[inicio:inicio + filas_bloque].desempaquetar()
+        destino.flush()
+    finally:
+        del destino
+
+def _escribir_parquet(ruta, tabla, comprimir, cancelado=None):
+    """
+    Escribe una tabla en Parquet, un grupo de filas por bloque (requiere pyarrow).
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValueError("Para exportar a Parquet instale el paquete pyarrow.")
+    nombres, total, leer = tabla
+    filas_bloque = max(1, CELDAS_BLOQUE_EXPORTACION // max(len(nombres), 1))
+    escritor = None
+    try:
+        for inicio in range(0, max(total, 1), filas_bloque):
+            if cancelado is not None and cancelado.is_set():
+                raise CalculoCancelado()
+            bloque = pa.table(dict(zip(nombres, leer(inicio, min(inicio + filas_bloque, total)))))
+            if escritor is None:
+                escritor = pq.ParquetWriter(ruta, bloque.schema, compression="zstd" if comprimir else "none")
+            escritor.write_table(bloque)
+    finally:
+        if escritor is not None:
+            escritor.close()
+
+@medido("escritura_resultados")
+def exportar_resultados(ruta_base, resultados, formato="npz", tipo=None, comprimir=True, decimales=None, progreso=None, cancelado=None):
+    """
+    Exporta matrices, marginales y muestras a disco para que otros programas las lean.
+
+    Con "npz" se escribe un solo archivo; con los demás formatos, una carpeta con un archivo por
+    entrada. Las matrices dispersas se guardan en coordenadas: en npz/npy como los arreglos
+    <nombre>_filas, _columnas, _valores y _forma; en CSV y Parquet como columnas fila, columna, valor.
+    CSV y Parquet se escriben por bloques, sin formatear ni copiar la tabla completa de una vez.
+
+    Las muestras de un archivo binario (MuestrasEmpaquetadas) nunca se desempaquetan completas: en npz se
+    guardan sus bytes tal como están en el archivo, como <nombre>_empaquetadas (una fila de np.packbits
+    por muestra) y <nombre>_canales (m), que np.unpackbits(..., axis=1, count=m) convierte en bits; en npy
+    se escriben desempaquetadas, de forma (n, m), un bloque a la vez; en CSV y Parquet, también por bloques.
 
     Parameters:
-        n (int): Número de muestras.
-        m (int): Número de canales.
-        muestras (list): Lista de muestras, donde cada muestra es una lista de bits.
+        ruta_base (str): Ruta de salida sin extensión.
+        resultados (dict): Nombre -> matriz (np.ndarray o MatrizDispersa) o muestras (también MuestrasEmpaquetadas).
+        formato (str): Uno de FORMATOS_EXPORTACION.
+        tipo (np.dtype | None): np.float32 para reducir a precisión simple los valores flotantes; None los conserva.
+        comprimir (bool): Comprime el npz, escribe CSV .csv.gz y Parquet con zstd (npy no se comprime).
+        decimales (int | None): Decimales fijos en CSV; None escribe los dígitos necesarios para no perder precisión.
+        progreso (callable | None): Recibe la fracción de entradas exportadas.
+        cancelado (threading.Event | None): Si se activa, se lanza CalculoCancelado.
 
     Returns:
-        tuple: Tupla con las matrices de transición y las muestras originales.
-            - EstadoCanalF (np.ndarray): Matriz de transición para el canal al futuro.
-            - EstadoEstadoF (np.ndarray): Matriz de transición para el estado al futuro.
-            - EstadoCanalP (np.ndarray): Matriz de transición para el canal al pasado.
-            - EstadoEstadoP (np.ndarray): Matriz de transición para el estado al pasado.
-            - EstadoCanalF_aux (np.ndarray): Matriz auxiliar de transición para el canal al futuro.
-            - EstadoEstadoF_aux (np.ndarray): Matriz auxiliar de transición para el estado al futuro.
-            - muestras_almacenadas (list): Lista de muestras original.
+        list: Rutas de los archivos escritos.
     """
-    # Matrices de transición para el canal y el estado
-    EstadoCanalF = np.zeros((2 ** m, 2 ** m), dtype=float)
-    EstadoEstadoF = np.zeros((2 ** m, 2 ** m), dtype=float)
-    EstadoCanalP = np.zeros((2 ** m, 2 ** m), dtype=float)
-    EstadoEstadoP = np.zeros((2 ** m, 2 ** m), dtype=float)
-    
-    # Matrices auxiliares para el cálculo del estado futuro
-    EstadoCanalF_aux = np.zeros((2 ** m, 2 ** m), dtype=float)
-    EstadoEstadoF_aux = np.zeros((2 ** m, 2 ** m), dtype=float)
-    
-    # Copia de las muestras para mantener los datos originales
-    muestras_almacenadas = muestras.copy()
+    if formato not in FORMATOS_EXPORTACION:
+        raise ValueError(f"Formato de exportación desconocido: {formato}.")
+
+    if formato in ("npz", "npy"):
+        arreglos = {}
+        for nombre, matriz in resultados.items():
+            if isinstance(matriz, MatrizDispersa):
+                arreglos[f"{nombre}_filas"] = matriz.filas
+                arreglos[f"{nombre}_columnas"] = matriz.columnas
+                arreglos[f"{nombre}_valores"] = _arreglo_exportable(matriz.valores, tipo)
+                arreglos[f"{nombre}_forma"] = np.array(matriz.shape)
+            elif isinstance(matriz, MuestrasEmpaquetadas):
+                if formato == "npz":
+                    arreglos[f"{nombre}_empaquetadas"] = matriz.empaquetadas
+                    arreglos[f"{nombre}_canales"] = np.array(matriz.m)
+                else:
+                    arreglos[nombre] = matriz
+            else:
+                arreglos[nombre] = _arreglo_exportable(matriz, tipo)
+
+        if formato == "npz":
+            _escribir_npz(ruta_base + ".npz", arreglos, comprimir, cancelado)
+            if progreso is not None:
+                progreso(1.0)
+            return [ruta_base + ".npz"]
+
+    os.makedirs(ruta_base, exist_ok=True)
+    rutas = []
+    entradas = arreglos if formato == "npy" else resultados
+    for k, (nombre, datos) in enumerate(entradas.items()):
+        if formato == "npy":
+            rutas.append(os.path.join(ruta_base, f"{nombre}.npy"))
+            if isinstance(datos, MuestrasEmpaquetadas):
+                _escribir_npy_por_bloques(rutas[-1], datos, cancelado)
+            else:
+                np.save(rutas[-1], datos)
+        elif formato == "csv":
+            rutas.append(os.path.join(ruta_base, f"{nombre}.csv" + (".gz" if comprimir else "")))
+            _escribir_csv(rutas[-1], _tabla_exportable(nombre, datos, tipo), comprimir, decimales, cancelado)
+        else:
+            rutas.append(os.path.join(ruta_base, f"{nombre}.parquet"))
+            _escribir_parquet(rutas[-1], _tabla_exportable(nombre, datos, tipo), comprimir, cancelado)
+        if progreso is not None:
+            progreso((k + 1) / len(entradas))
+    return rutas
 
-    # Bucle sobre las muestras
-    for i in range(n):
-        muestra = muestras[i]
+def _nombre_marginal(canales_presente, canales_futuro):
+    """
+    Nombre con el que se guarda una marginal, por ejemplo "marginal_P1-2_F1-2".
+    """
+    return "marginal_P{}_F{}".format("-".join(map(str, canales_presente)), "-".join(map(str, canales_futuro)))
 
-        # Actualización de matrices de transición para el canal y el estado
-        for j in range(m):
-            EstadoCanalF[int(''.join(map(str, muestra)), 2)][int(''.join(map(str, muestra)), 2)] += 1 / (n - (i == n-1))
-            if j < m - 1:
-                EstadoEstadoF[int(''.join(map(str, muestra)), 2)][int(''.join(map(str, muestra[j + 1:])), 2)] += 1 / (n - (i == n-1))
+def _agregar_marginales(resultados, marginales, matriz_marginal):
+    """
+    Añade al diccionario de resultados las marginales normalizadas pedidas sobre una de sus matrices.
+    """
+    calculadas = RedMarginales(resultados[matriz_marginal]).calcular(marginales)
+    for (canales_presente, canales_futuro), marginal in calculadas.items():
+        resultados[_nombre_marginal(canales_presente, canales_futuro)] = marginal
+    return resultados
 
-        # Actualización de matrices auxiliares
-        if i > 0:
-            EstadoCanalF_aux[int(''.join(map(str, muestra)), 2)][int(''.join(map(str, muestra)), 2)] += 1 / n
-            EstadoEstadoF_aux[int(''.join(map(str, muestra)), 2)][int(''.join(map(str, muestra)), 2)] += 1 / n
+def procesar_lote(archivos, salida, marginales=(), matriz_marginal='EstadoEstadoF', formato="npz", dispersa=False, usar_cache=True,
+                  tipo=None, comprimir=True):
+    """
+    Procesa varios archivos de muestras sin interfaz gráfica y guarda las matrices en disco.
 
-        # Actualización de matrices de transición para el estado pasado
-        for j in range(m):
-            muestra_previa = muestra.copy()
-            muestra_previa[j] = 1 - muestra_previa[j]
-            EstadoCanalP[int(''.join(map(str, muestra_previa)), 2)][int(''.join(map(str, muestra)), 2)] += 1 / (n - (i == n-1))
-        if i > 0:
-            EstadoEstadoP[int(''.join(map(str, muestras[i - 1])), 2)][int(''.join(map(str, muestra)), 2)] += 1 / (n - (i == n-1))
+    Parameters:
+        archivos (list): Rutas de los archivos de muestras, CSV o binarios (o carpetas que los contienen).
+        salida (str): Carpeta donde se escriben los resultados (uno por archivo de entrada).
+        marginales (list): Pares (canales_presente, canales_futuro) a marginalizar y normalizar.
+        matriz_marginal (str): Nombre de la matriz sobre la que se calculan las marginales.
+        formato (str): Uno de FORMATOS_EXPORTACION.
+        dispersa (bool): Si es True las matrices se calculan como MatrizDispersa.
+        usar_cache (bool): Si es True se reutilizan los resultados de la caché en disco.
+        tipo (np.dtype | None): np.float32 para exportar los valores en precisión simple.
+        comprimir (bool): Si se comprimen los archivos exportados (ver exportar_resultados).
 
-    # Devuelve las matrices calculadas y las muestras originales
-    return (
-        EstadoCanalF,
-        EstadoEstadoF,
-        EstadoCanalP,
-        EstadoEstadoP,
-        EstadoCanalF_aux,
-        EstadoEstadoF_aux,
-        muestras_almacenadas,
+    Returns:
+        list: Rutas de los archivos escritos.
+    """
+    os.makedirs(salida, exist_ok=True)
+    escritos = []
+    for archivo in _expandir_rutas(archivos):
+        if usar_cache:
+            matrices = procesar_archivo_con_cache(archivo, dispersa=dispersa)
+        else:
+            matrices = modelo_desde_archivo(archivo, dispersa).matrices()
+        resultados = _agregar_marginales(dict(zip(NOMBRES_MATRICES, matrices)), marginales, matriz_marginal)
+
+        ruta_base = os.path.join(salida, os.path.splitext(os.path.basename(archivo))[0])
+        escritos += exportar_resultados(ruta_base, resultados, formato, tipo, comprimir)
+    return escritos
+
+def main(argumentos=None):
+    """
+    Punto de entrada: sin archivos abre la interfaz gráfica; con archivos los procesa por lotes.
+    """
+    parser = argparse.ArgumentParser(description="Matrices de transición de datos y estados.")
+    parser.add_argument("archivos", nargs="*", help="Archivos de muestras (CSV o binarios) a procesar sin interfaz gráfica.")
+    parser.add_argument("-o", "--salida", default="resultados", help="Carpeta de salida (por defecto: resultados).")
+    parser.add_argument("--formato", choices=FORMATOS_EXPORTACION, default="npz", help="Formato de salida (parquet requiere pyarrow).")
+    parser.add_argument("--float32", action="store_true", help="Exportar los valores en precisión simple (la mitad de tamaño).")
+    parser.add_argument("--sin-compresion", action="store_true", help="No comprimir los archivos exportados.")
+    parser.add_argument(
+        "--marginal", action="append", default=[], metavar="PRESENTE:FUTURO",
+        help='Canales a conservar, por ejemplo "1,2:1,2". Se puede repetir.',
+    )
+    parser.add_argument("--matriz", choices=NOMBRES_MATRICES, default='EstadoEstadoF', help="Matriz a marginalizar.")
+    parser.add_argument("--dispersa", action="store_true", help="Usar matrices dispersas (muchos canales).")
+    parser.add_argument("--sin-cache", action="store_true", help="No leer ni escribir la caché de resultados.")
+    parser.add_argument(
+        "--combinar", action="store_true",
+        help="Procesar todos los archivos en paralelo y guardar un solo resultado combinado.",
     )
+    parser.add_argument(
+        "--convertir", action="store_true",
+        help=f"Solo convertir los archivos CSV al formato binario ({EXTENSION_BINARIA}) en la carpeta de salida.",
+    )
+    parser.add_argument("--procesos", type=int, default=None, help="Procesos para --combinar (por defecto: todos los núcleos).")
+    parser.add_argument(
+        "--aleatorio", type=int, nargs=2, metavar=("N", "M"),
+        help="Generar N muestras aleatorias de M canales por bloques (sin archivos) y guardar sus matrices.",
+    )
+    parser.add_argument("--semilla", type=int, default=None, help="Semilla para --aleatorio.")
+    parser.add_argument("--reporte", metavar="RUTA.json", help="Medir cada etapa y guardar el reporte de rendimiento en este archivo.")
+    parser.add_argument("--medir-memoria", action="store_true", help="Incluir en el reporte el pico de memoria de cada etapa (más lento).")
+    parser.add_argument("--perfilador", choices=Instrumentacion.PERFILADORES, help="Perfilar el cálculo e incluir el perfil en el reporte.")
+    args = parser.parse_args(argumentos)
+
+    if args.reporte or args.medir_memoria or args.perfilador:
+        INSTRUMENTACION.activa = True
+        INSTRUMENTACION.medir_memoria = args.medir_memoria
+        INSTRUMENTACION.perfilador = args.perfilador
+
+    if not args.archivos and not args.aleatorio:
+        interfaz = InterfazGrafica()
+        interfaz.run()
+        return
+
+    marginales = []
+    for texto in args.marginal:
+        presente, _, futuro = texto.partition(":")
+        marginales.append((_leer_canales(presente), _leer_canales(futuro)))
+
+    tipo = np.float32 if args.float32 else None
+    with INSTRUMENTACION.ejecucion("Procesamiento por lotes"):
+        if args.convertir:
+            os.makedirs(args.salida, exist_ok=True)
+            escritos = [
+                convertir_csv_a_binario(ruta, os.path.join(args.salida, os.path.splitext(os.path.basename(ruta))[0] + EXTENSION_BINARIA))
+                for ruta in _expandir_rutas(args.archivos) if not es_binario(ruta)
+            ]
+        elif args.combinar or args.aleatorio:
+            if args.aleatorio:
+                modelo, nombre = modelo_aleatorio(*args.aleatorio, args.semilla, args.dispersa), "aleatorio"
+            else:
+                modelo, nombre = procesar_en_paralelo(args.archivos, args.procesos, args.dispersa), "combinado"
+            resultados = _agregar_marginales(dict(zip(NOMBRES_MATRICES, modelo.matrices())), marginales, args.matriz)
+            os.makedirs(args.salida, exist_ok=True)
+            escritos = exportar_resultados(os.path.join(args.salida, nombre), resultados, args.formato, tipo, not args.sin_compresion)
+        else:
+            escritos = procesar_lote(
+                args.archivos, args.salida, marginales, args.matriz, args.formato, args.dispersa, not args.sin_cache,
+                tipo, not args.sin_compresion,
+            )
+    if args.reporte:
+        escritos.append(INSTRUMENTACION.guardar_reporte(args.reporte))
+    elif INSTRUMENTACION.activa:
+        print(INSTRUMENTACION.resumen())
+        if INSTRUMENTACION.perfil:
+            print(INSTRUMENTACION.perfil)
+    for ruta in escritos:
+        print(ruta)
+
+class TrabajadorFondo:
+    """
+    Ejecuta cálculos largos en un hilo aparte para que la interfaz siga respondiendo.
 
-def marginalizar(matriz, indices):
+    Solo hay un trabajo vigente a la vez: enviar uno nuevo cancela el anterior y los resultados de
+    trabajos cancelados o reemplazados se descartan. El hilo de cálculo no toca la interfaz; deja sus
+    avisos (avance, resultado o error) en una cola que la interfaz atiende con atender().
     """
-    Realiza la marginalización de una matriz dado un conjunto de índices.
 
-    Parameters:
-        matriz (np.ndarray): Matriz a marginalizar.
-        indices (list): Lista de índices de columnas a marginalizar.
+    def __init__(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        self._ejecutor = ThreadPoolExecutor(max_workers=1)
+        self._avisos = queue.Queue()
+        self._ultimo_trabajo = 0
+        self._cancelado = threading.Event()
+        self._respuestas = {}
+
+    @property
+    def ocupado(self):
+        """
+        Indica si hay un trabajo vigente cuyo resultado todavía no se atendió.
+        """
+        return bool(self._respuestas)
+
+    def enviar(self, funcion, *args, al_terminar=None, al_fallar=None, al_avanzar=None):
+        """
+        Envía un trabajo, cancelando el que estuviera en curso.
+
+        Parameters:
+            funcion (callable): Se llama como funcion(*args, progreso=..., cancelado=...).
+            args: Argumentos del trabajo.
+            al_terminar (callable | None): Recibe el resultado.
+            al_fallar (callable | None): Recibe la excepción si el trabajo falla.
+            al_avanzar (callable | None): Recibe la fracción de avance.
+
+        Returns:
+            int: Identificador del trabajo.
+        """
+        self.cancelar()
+        self._ultimo_trabajo += 1
+        trabajo = self._ultimo_trabajo
+        cancelado = self._cancelado = threading.Event()
+        self._respuestas[trabajo] = (al_terminar, al_fallar, al_avanzar)
+
+        def ejecutar():
+            try:
+                resultado = funcion(*args, progreso=lambda fraccion: self._avisos.put((trabajo, 'avance', fraccion)), cancelado=cancelado)
+                self._avisos.put((trabajo, 'fin', resultado))
+            except CalculoCancelado:
+                self._avisos.put((trabajo, 'cancelado', None))
+            except Exception as error:
+                self._avisos.put((trabajo, 'error', error))
+
+        self._ejecutor.submit(ejecutar)
+        return trabajo
+
+    def cancelar(self):
+        """
+        Pide cancelar el trabajo en curso y descarta cualquier aviso suyo que quede pendiente.
+        """
+        self._cancelado.set()
+        self._respuestas.clear()
+
+    def cerrar(self):
+        """
+        Cancela el trabajo en curso y libera el hilo de cálculo sin esperarlo, para que el programa pueda terminar.
+        """
+        self.cancelar()
+        self._ejecutor.shutdown(wait=False, cancel_futures=True)
+
+    def atender(self):
+        """
+        Entrega los avisos pendientes del trabajo vigente. Se debe llamar desde el hilo de la interfaz.
+
+        Returns:
+            bool: True si el trabajo vigente todavía no terminó.
+        """
+        while True:
+            try:
+                trabajo, tipo, dato = self._avisos.get_nowait()
+            except queue.Empty:
+                break
+            if trabajo not in self._respuestas:
+                continue  # Aviso de un trabajo cancelado o reemplazado
+            al_terminar, al_fallar, al_avanzar = self._respuestas[trabajo]
+            if tipo == 'avance':
+                if al_avanzar is not None:
+                    al_avanzar(dato)
+                continue
+            del self._respuestas[trabajo]
+            if tipo == 'fin' and al_terminar is not None:
+                al_terminar(dato)
+            elif tipo == 'error' and al_fallar is not None:
+                al_fallar(dato)
+        return self.ocupado
+
+# A partir de este número de canales la interfaz guarda las matrices como MatrizDispersa: las densas
+# de 2^m x 2^m no caben en memoria con 20 a 30 canales
+M_DISPERSA = 13
+
+def _calcular_muestras(muestras, m, tipo=np.float64, progreso=None, cancelado=None):
+    """
+    Calcula las matrices de muestras en memoria por bloques, informando el avance.
 
     Returns:
-        np.ndarray: Matriz marginalizada.
+        tuple: Las seis matrices en el mismo orden que procesamiento_datos (dispersas desde M_DISPERSA
+            canales), seguidas de las muestras.
     """
-    if matriz is None:
-        return np.zeros((0,))  # Retorna una matriz vacía si la matriz es None
-    return np.sum(matriz[:, indices], axis=1) / 2  # Dividimos entre 2 para ajustar según la lógica mencionada
+    modelo = ModeloTransiciones(m, dispersa=m >= M_DISPERSA)
+    bloques = (muestras[inicio:inicio + TAM_BLOQUE] for inicio in range(0, len(muestras), TAM_BLOQUE))
+    for bloque in _seguir_bloques(bloques, len(muestras), progreso, cancelado):
+        modelo.actualizar(bloque)
+    return modelo.matrices(tipo) + (muestras,)
 
-def normalizar(matriz):
+def _generar_y_calcular(n, m, semilla=None, tipo=np.float64, progreso=None, cancelado=None):
     """
-    Normaliza una matriz dividiendo cada fila por la suma de sus elementos.
+    Genera n muestras aleatorias de m canales por bloques y calcula sus matrices.
 
-    Parameters:
-        matriz (np.ndarray): Matriz a normalizar.
+    Las muestras se generan como índices de estado, igual que en modelo_aleatorio (y en --aleatorio),
+    por lo que una misma semilla da las mismas matrices en la interfaz y en el modo por lotes.
 
     Returns:
-        np.ndarray: Matriz normalizada.
+        tuple: Las seis matrices en el mismo orden que procesamiento_datos (dispersas desde M_DISPERSA
+            canales), seguidas de las primeras MAX_MUESTRAS_VISTA muestras generadas (para "Mostrar Datos").
     """
-    suma_filas = np.sum(matriz, axis=1, keepdims=True)
+    modelo = ModeloTransiciones(m, dispersa=m >= M_DISPERSA)
+    vista_previa = None
+    for estados in _seguir_bloques(generar_bloques_aleatorios(n, m, semilla, estados=True), n, progreso, cancelado):
+        if vista_previa is None:
+            vista_previa = decodificar_estados(estados[:MAX_MUESTRAS_VISTA], m)
+        modelo.actualizar_estados(estados)
+    return modelo.matrices(tipo) + (vista_previa,)
+
+def _cargar_archivo(ruta, tipo=np.float64, progreso=None, cancelado=None):
+    """
+    Calcula las matrices de un archivo de muestras y prepara las muestras que se pueden mostrar.
 
-    # Reemplazar ceros en la suma para evitar divisiones por cero
-    suma_filas[suma_filas == 0] = 1
+    Returns:
+        tuple: (matrices, muestras), donde matrices son dispersas si el archivo tiene M_DISPERSA canales
+            o más, y muestras es el archivo binario mapeado en memoria o las primeras MAX_MUESTRAS_VISTA
+            filas de un CSV.
+    """
+    dispersa = canales_archivo(ruta) >= M_DISPERSA
+    matrices = procesar_archivo_con_cache(ruta, dispersa=dispersa, tipo=tipo, progreso=progreso, cancelado=cancelado)
+    if es_binario(ruta):
+        # El archivo binario queda mapeado en memoria: el visor lee solo las filas visibles
+        return matrices, cargar_binario(ruta)
+    vista_previa = next(leer_csv_por_bloques(ruta, MAX_MUESTRAS_VISTA), None)
+    return matrices, vista_previa.tolist() if vista_previa is not None else None
+
+def _estados_futuros(matriz, grupos_canales, progreso=None, cancelado=None):
+    """
+    Marginaliza la matriz a cada grupo de canales (en presente y futuro) y normaliza cada resultado.
 
-    # Normalizar la matriz
-    matriz_normalizada = matriz / suma_filas
+    La matriz puede ser una RedMarginales ya creada, para aprovechar las marginales que ya calculó.
+    """
+    red = matriz if isinstance(matriz, RedMarginales) else RedMarginales(matriz)
+    familia = [(tuple(canales), tuple(canales)) for canales in grupos_canales]
+    resultados = red.calcular(familia, progreso=progreso, cancelado=cancelado)
+    return [resultados[par] for par in familia]
 
-    return matriz_normalizada
+def _bloques_origen(origen):
+    """
+    Vuelve a producir por bloques las muestras completas de un cálculo de la interfaz a partir de su
+    origen: ("csv", ruta) relee el archivo y ("aleatorio", n, m, semilla) repite la generación.
+    """
+    if origen[0] == "csv":
+        return leer_csv_por_bloques(origen[1])
+    _, n, m, semilla = origen
+    return (decodificar_estados(estados, m) for estados in generar_bloques_aleatorios(n, m, semilla, estados=True))
 
-def marginalizar_y_normalizar(matriz, indices_filas, indices_columnas):
+def _exportar_con_marginales(ruta_base, resultados, red, formato, tipo, origen_muestras=None, progreso=None, cancelado=None):
     """
-    Realiza la marginalización y normalización de una matriz dado un conjunto de índices de filas y columnas.
+    Agrega a los resultados las marginales BC y ABC de la RedMarginales dada (si hay al menos 3 canales)
+    y los exporta con exportar_resultados.
+
+    La interfaz solo guarda una vista previa de las muestras de un CSV o de una generación aleatoria; con
+    origen_muestras (ver _bloques_origen) las muestras completas se empaquetan bloque a bloque en un
+    archivo binario temporal junto a la salida, y se exportan desde él como las de un archivo binario.
+    """
+    import tempfile
+    if red.m_presente >= 3:
+        for canales in ([1, 2], [0, 1, 2]):
+            if cancelado is not None and cancelado.is_set():
+                raise CalculoCancelado()
+            resultados[_nombre_marginal(canales, canales)] = red.marginal_normalizada(canales, canales)
+    if origen_muestras is None:
+        return exportar_resultados(ruta_base, resultados, formato, tipo, progreso=progreso, cancelado=cancelado)
+
+    descriptor, temporal = tempfile.mkstemp(suffix=EXTENSION_BINARIA, dir=os.path.dirname(os.path.abspath(ruta_base)))
+    os.close(descriptor)
+    try:
+        guardar_binario(temporal, _seguir_bloques(_bloques_origen(origen_muestras), 0, cancelado=cancelado))
+        resultados["muestras"] = cargar_binario(temporal)
+        return exportar_resultados(ruta_base, resultados, formato, tipo, progreso=progreso, cancelado=cancelado)
+    finally:
+        resultados.pop("muestras", None)
+        try:
+            os.remove(temporal)
+        except OSError:
+            pass
+
+def _forma_datos(datos):
+    """
+    Devuelve (filas, columnas) de una matriz o conjunto de muestras en cualquiera de sus representaciones.
+    """
+    if isinstance(datos, list):
+        return (len(datos), len(datos[0]) if datos else 0)
+    return tuple(datos.shape)
+
+def ventana_datos(datos, fila_inicio, fila_fin, columna_inicio, columna_fin):
+    """
+    Extrae un rectángulo de una matriz o conjunto de muestras sin materializar el resto.
 
     Parameters:
-        matriz (np.ndarray): Matriz a procesar.
-        indices_filas (list): Lista de índices de filas a marginalizar.
-        indices_columnas (list): Lista de índices de columnas a marginalizar.
+        datos (np.ndarray | MatrizDispersa | MuestrasEmpaquetadas | list | pd.DataFrame): Datos de origen.
+        fila_inicio, fila_fin (int): Rango de filas [inicio, fin).
+        columna_inicio, columna_fin (int): Rango de columnas [inicio, fin).
 
     Returns:
-        np.ndarray: Matriz resultante después de la marginalización y normalización.
+        np.ndarray: Arreglo denso con el rectángulo pedido.
     """
-    matriz_marginalizada = marginalizar(matriz, indices_columnas)
-    matriz_normalizada = normalizar(matriz_marginalizada.reshape(-1, 2 ** len(indices_filas)))
-    return matriz_normalizada.reshape(-1, 2 ** len(indices_columnas))
+    if isinstance(datos, MatrizDispersa):
+        return datos.ventana(fila_inicio, fila_fin, columna_inicio, columna_fin)
+    if isinstance(datos, MuestrasEmpaquetadas):
+        return datos[fila_inicio:fila_fin].desempaquetar()[:, columna_inicio:columna_fin]
+    if hasattr(datos, "iloc"):
+        return datos.iloc[fila_inicio:fila_fin, columna_inicio:columna_fin].to_numpy()
+    filas = np.asarray(datos[fila_inicio:fila_fin])
+    return filas.reshape(len(filas), -1)[:, columna_inicio:columna_fin]
+
+@medido("mapa_calor")
+def resumen_mapa_calor(datos, max_celdas=200):
+    """
+    Reduce una matriz o conjunto de muestras a lo sumo a max_celdas x max_celdas promediando bloques.
+
+    Parameters:
+        datos (np.ndarray | MatrizDispersa | MuestrasEmpaquetadas | list | pd.DataFrame): Datos de origen.
+        max_celdas (int): Número máximo de bloques por eje.
+
+    Returns:
+        np.ndarray: Promedio de cada bloque, de forma (bloques_filas, bloques_columnas).
+    """
+    filas, columnas = _forma_datos(datos)
+    paso_filas = max(1, -(-filas // max_celdas))
+    paso_columnas = max(1, -(-columnas // max_celdas))
+    forma = (-(-filas // paso_filas), -(-columnas // paso_columnas))
+
+    if isinstance(datos, MatrizDispersa):
+        bloques = (datos.filas // paso_filas) * forma[1] + datos.columnas // paso_columnas
+        sumas = np.bincount(bloques, weights=datos.valores, minlength=forma[0] * forma[1])
+        return sumas.reshape(forma) / (paso_filas * paso_columnas)
+
+    # Las muestras se recorren por bloques de filas para no desempaquetarlas todas a la vez
+    sumas = np.zeros(forma)
+    filas_por_lectura = paso_filas * max(1, TAM_BLOQUE // max(paso_filas * max(columnas, 1), 1))
+    for inicio in range(0, filas, filas_por_lectura):
+        trozo = ventana_datos(datos, inicio, min(inicio + filas_por_lectura, filas), 0, columnas).astype(float)
+        relleno = (-len(trozo) % paso_filas, -columnas % paso_columnas)
+        trozo = np.pad(trozo, ((0, relleno[0]), (0, relleno[1])))
+        bloques = trozo.reshape(-1, paso_filas, forma[1], paso_columnas).sum(axis=(1, 3))
+        sumas[inicio // paso_filas:inicio // paso_filas + len(bloques)] += bloques
+    return sumas / (paso_filas * paso_columnas)
+
+class VisorPaginado:
+    """
+    Visor de matrices y muestras que solo crea en el Treeview las filas y columnas que caben en pantalla.
+
+    El desplazamiento (barras, rueda del ratón) cambia la ventana visible y vuelve a pedir solo ese
+    rectángulo a los datos, por lo que el costo de dibujar depende del tamaño de la ventana y no del de
+    los datos. Incluye un modo de mapa de calor para ver matrices grandes completas y una opción para
+    imprimir la ventana visible en consola.
+    """
+
+    ALTO_FILA = 20
+    ANCHO_COLUMNA = 60
+    ANCHO_ETIQUETA = 90
+    LADO_MAPA = 400
+
+    def __init__(self, padre, datos, etiqueta_fila, etiqueta_columna, decimales=2):
+        """
+        Parameters:
+            padre (tk.Widget): Contenedor donde se dibuja el visor.
+            datos (np.ndarray | MatrizDispersa | MuestrasEmpaquetadas | list | pd.DataFrame): Datos a mostrar.
+            etiqueta_fila (callable): Recibe el índice de una fila y devuelve su etiqueta.
+            etiqueta_columna (callable): Recibe el índice de una columna y devuelve su encabezado.
+            decimales (int | None): Decimales con que se muestran los valores (None para no redondear).
+        """
+        self.datos = datos
+        self.forma = _forma_datos(datos)
+        self.etiqueta_fila = etiqueta_fila
+        self.etiqueta_columna = etiqueta_columna
+        self.decimales = decimales
+        self.inicio = [0, 0]
+        self.visibles = [min(self.forma[0], 20), min(self.forma[1], 10)]
+
+        self.frame = ttk.Frame(padre)
+        self.frame.pack(fill=tk.BOTH, expand=True)
+        self.frame.rowconfigure(0, weight=1)
+        self.frame.columnconfigure(0, weight=1)
+
+        self.tree = ttk.Treeview(self.frame, height=self.visibles[0])
+        self.tree.column("#0", width=self.ANCHO_ETIQUETA, stretch=False)
+        self.barra_vertical = ttk.Scrollbar(self.frame, orient=tk.VERTICAL, command=lambda *args: self._mover(0, *args))
+        self.barra_horizontal = ttk.Scrollbar(self.frame, orient=tk.HORIZONTAL, command=lambda *args: self._mover(1, *args))
+        self.tree.grid(row=0, column=0, sticky="nsew")
+        self.barra_vertical.grid(row=0, column=1, sticky="ns")
+        self.barra_horizontal.grid(row=1, column=0, sticky="ew")
+
+        self.canvas = tk.Canvas(self.frame, width=self.LADO_MAPA, height=self.LADO_MAPA, background="white")
+        self.imagen = None
+
+        botones = ttk.Frame(self.frame)
+        botones.grid(row=2, column=0, columnspan=2, sticky="ew")
+        self.texto_resumen = tk.StringVar()
+        ttk.Label(botones, textvariable=self.texto_resumen).pack(side=tk.LEFT, padx=5)
+        ttk.Button(botones, text="Imprimir en consola", command=self.imprimir_consola).pack(side=tk.RIGHT, padx=5)
+        self.boton_mapa = ttk.Button(botones, text="Mapa de calor", command=self.alternar_mapa)
+        self.boton_mapa.pack(side=tk.RIGHT, padx=5)
+
+        self.tree.bind("<Configure>", self._ajustar_tamano)
+        self.tree.bind("<MouseWheel>", lambda evento: self._mover(0, "scroll", -1 if evento.delta > 0 else 1, "units"))
+        self.tree.bind("<Button-4>", lambda evento: self._mover(0, "scroll", -1, "units"))
+        self.tree.bind("<Button-5>", lambda evento: self._mover(0, "scroll", 1, "units"))
+        self._refrescar()
+
+    def _ajustar_tamano(self, evento):
+        """
+        Recalcula cuántas filas y columnas caben en el Treeview cuando cambia el tamaño de la ventana.
+        """
+        filas = max(1, (evento.height - self.ALTO_FILA - 4) // self.ALTO_FILA)
+        columnas = max(1, (evento.width - self.ANCHO_ETIQUETA) // self.ANCHO_COLUMNA)
+        visibles = [min(self.forma[0], filas), min(self.forma[1], columnas)]
+        if visibles != self.visibles:
+            self.visibles = visibles
+            self._refrescar()
+
+    def _mover(self, eje, accion, cantidad, unidad=None):
+        """
+        Atiende los comandos de las barras de desplazamiento ("moveto" o "scroll") en el eje dado.
+        """
+        total, visibles = self.forma[eje], self.visibles[eje]
+        if accion == "moveto":
+            inicio = int(float(cantidad) * total)
+        else:
+            inicio = self.inicio[eje] + int(cantidad) * (visibles if unidad == "pages" else 1)
+        self.inicio[eje] = max(0, min(inicio, total - visibles))
+        self._refrescar()
+
+    def _ventana_visible(self):
+        fila_inicio, columna_inicio = self.inicio
+        fila_fin = fila_inicio + self.visibles[0]
+        columna_fin = columna_inicio + self.visibles[1]
+        return ventana_datos(self.datos, fila_inicio, fila_fin, columna_inicio, columna_fin)
+
+    @medido("dibujo_treeview")
+    def _refrescar(self):
+        """
+        Vuelve a dibujar solo la ventana visible de los datos.
+        """
+        fila_inicio, columna_inicio = self.inicio
+        columnas = [f"c{k}" for k in range(self.visibles[1])] if self.forma[1] else ["vacia"]
+        if tuple(self.tree["columns"]) != tuple(columnas):
+            self.tree["columns"] = columnas
+            for columna in columnas:
+                self.tree.column(columna, anchor=tk.CENTER, width=self.ANCHO_COLUMNA, stretch=False)
+        self.tree.delete(*self.tree.get_children())
+
+        if not self.forma[0] or not self.forma[1]:
+            # Si no hay datos, agregar una fila con valores vacíos
+            self.tree.heading(columnas[0], text="")
+            self.tree.insert("", tk.END, text="No hay datos", values=[""] * len(columnas))
+        else:
+            for k, columna in enumerate(columnas):
+                self.tree.heading(columna, text=self.etiqueta_columna(columna_inicio + k))
+            valores = self._ventana_visible()
+            if self.decimales is not None and valores.dtype.kind == "f":
+                valores = np.round(valores, self.decimales)
+            for k, fila in enumerate(valores.tolist()):
+                self.tree.insert("", tk.END, text=self.etiqueta_fila(fila_inicio + k), values=fila)
+
+        for eje, barra in enumerate((self.barra_vertical, self.barra_horizontal)):
+            total = max(self.forma[eje], 1)
+            barra.set(self.inicio[eje] / total, (self.inicio[eje] + self.visibles[eje]) / total)
+        self.texto_resumen.set(
+            f"Filas {fila_inicio}-{fila_inicio + self.visibles[0] - 1} de {self.forma[0]}, "
+            f"columnas {columna_inicio}-{columna_inicio + self.visibles[1] - 1} de {self.forma[1]}"
+        )
+
+    def alternar_mapa(self):
+        """
+        Cambia entre la tabla paginada y un mapa de calor de los datos completos, promediados por bloques.
+        """
+        if self.canvas.winfo_ismapped():
+            self.canvas.grid_remove()
+            self.tree.grid()
+            self.boton_mapa.configure(text="Mapa de calor")
+            return
+
+        resumen = resumen_mapa_calor(self.datos)
+        maximo = resumen.max() if resumen.size else 0
+        intensidad = np.clip(255 * (1 - resumen / maximo) if maximo > 0 else np.full(resumen.shape, 255.0), 0, 255).astype(int)
+        filas_color = [
+            "{" + " ".join(f"#{valor:02x}{valor:02x}ff" for valor in fila) + "}" for fila in intensidad.tolist()
+        ]
+        self.imagen = tk.PhotoImage(width=resumen.shape[1], height=resumen.shape[0])
+        if filas_color:
+            self.imagen.put(" ".join(filas_color))
+        escala = max(1, self.LADO_MAPA // max(resumen.shape + (1,)))
+        self.imagen = self.imagen.zoom(escala)
+        self.canvas.delete("all")
+        self.canvas.create_image(0, 0, image=self.imagen, anchor=tk.NW)
+
+        self.tree.grid_remove()
+        self.canvas.grid(row=0, column=0, sticky="nsew")
+        self.boton_mapa.configure(text="Tabla")
+        self.texto_resumen.set(
+            f"{self.forma[0]} x {self.forma[1]}, bloques de {resumen.shape[0]} x {resumen.shape[1]}, máximo promedio {maximo:.4g}"
+        )
+
+    @medido("tabla_prettytable")
+    def imprimir_consola(self):
+        """
+        Imprime en consola, con PrettyTable, la ventana de datos visible en este momento.
+        """
+        fila_inicio, columna_inicio = self.inicio
+        tabla = PrettyTable()
+        tabla.field_names = [""] + [self.etiqueta_columna(columna_inicio + k) for k in range(self.visibles[1])]
+        valores = self._ventana_visible()
+        for k, fila in enumerate(valores.tolist()):
+            if self.decimales is not None and valores.dtype.kind == "f":
+                fila = [f"{valor:.{self.decimales}f}" for valor in fila]
+            tabla.add_row([self.etiqueta_fila(fila_inicio + k)] + fila)
+        print(tabla)
 
 # Clase para la interfaz gráfica
 class InterfazGrafica:
@@ -130,20 +3171,25 @@ class InterfazGrafica:
         """
         Inicializa la interfaz gráfica y configura elementos como la ventana principal, etiquetas, botones, y estilos.
         """
+        _importar_gui()
         self.window = ThemedTk(theme="arc")
         self.window.title("Proyecto Matrices de Datos y Estados")
         self.window.geometry("800x600")
 
         self.muestras_almacenadas = None
+        self.origen_muestras = None
         self.matrices = None
+        self.red_marginales = None
 
         style = ttk.Style()
         style.configure("TButton", padding=5, font=('Helvetica', 12))
 
         self.n_label = ttk.Label(self.window, text="Número de muestras (n):", font=('Helvetica', 12)) 
         self.m_label = ttk.Label(self.window, text="Número de canales (m):", font=('Helvetica', 12))
+        self.semilla_label = ttk.Label(self.window, text="Semilla (opcional):", font=('Helvetica', 12))
         self.n_entry = ttk.Entry(self.window)
         self.m_entry = ttk.Entry(self.window)
+        self.semilla_entry = ttk.Entry(self.window)
 
         self.btn_manual = ttk.Button(self.window, text="Ingresar datos manualmente", command=self.ingresar_manualmente, style="TButton")
         self.btn_aleatorio = ttk.Button(self.window, text="Generar datos aleatorios", command=self.generar_aleatorios, style="TButton")
@@ -155,12 +3201,14 @@ class InterfazGrafica:
         self.btn_marginalizar_y_normalizar = ttk.Button(self.window, text="Marginalizar y Normalizar", command=self.marginalizar_y_normalizar, style="TButton")
         self.btn_mostrar_datos = ttk.Button(self.window, text="Mostrar Datos", command=self.mostrar_datos, style="TButton")
         self.btn_cargar_csv = ttk.Button(self.window, text="Cargar desde CSV", command=self.cargar_csv, style="TButton")
-        self.btn_salir = ttk.Button(self.window, text="Salir", command=self.window.quit, style="TButton")
+        self.btn_salir = ttk.Button(self.window, text="Salir", command=self.salir, style="TButton")
 
         self.n_label.grid(row=0, column=0, pady=5, padx=5)
         self.n_entry.grid(row=0, column=1, pady=5, padx=5)
         self.m_label.grid(row=1, column=0, pady=5, padx=5)
         self.m_entry.grid(row=1, column=1, pady=5, padx=5)
+        self.semilla_label.grid(row=0, column=2, pady=5, padx=5)
+        self.semilla_entry.grid(row=1, column=2, pady=5, padx=5)
 
         self.btn_manual.grid(row=2, column=0, columnspan=2, pady=5)
         self.btn_aleatorio.grid(row=3, column=0, columnspan=2, pady=5)
@@ -174,9 +3222,50 @@ class InterfazGrafica:
         self.btn_mostrar_matriz_ejemplo.grid(row=11, column=0, columnspan=2, pady=5)
         self.btn_salir.grid(row=12, column=0, columnspan=2, pady=5)
 
-        # Ventanas internas para mostrar las matrices de estados y los datos
+        # Avance de los cálculos en segundo plano
+        self.trabajador = TrabajadorFondo()
+        self.atendiendo_trabajos = False
+        self.window.protocol("WM_DELETE_WINDOW", self.salir)
+        self.estado_trabajo = tk.StringVar()
+        self.barra_progreso = ttk.Progressbar(self.window, maximum=1.0, length=300)
+        self.lbl_estado_trabajo = ttk.Label(self.window, textvariable=self.estado_trabajo, font=('Helvetica', 10))
+        self.btn_cancelar = ttk.Button(self.window, text="Cancelar", command=self.cancelar_trabajo, style="TButton", state=tk.DISABLED)
+        self.barra_progreso.grid(row=13, column=0, pady=5, padx=5)
+        self.btn_cancelar.grid(row=13, column=1, pady=5)
+        self.lbl_estado_trabajo.grid(row=14, column=0, columnspan=2)
+
+        # Medición de rendimiento de los cálculos
+        self.medir_rendimiento = tk.BooleanVar(value=INSTRUMENTACION.activa)
+        self.medir_memoria = tk.BooleanVar(value=INSTRUMENTACION.medir_memoria)
+        self.perfilar = tk.BooleanVar(value=INSTRUMENTACION.perfilador == "cprofile")
+        self.chk_medir = ttk.Checkbutton(self.window, text="Medir rendimiento", variable=self.medir_rendimiento, command=self.configurar_instrumentacion)
+        self.chk_memoria = ttk.Checkbutton(self.window, text="Medir memoria (más lento)", variable=self.medir_memoria, command=self.configurar_instrumentacion)
+        self.chk_perfilar = ttk.Checkbutton(self.window, text="Perfilar con cProfile", variable=self.perfilar, command=self.configurar_instrumentacion)
+        self.btn_rendimiento = ttk.Button(self.window, text="Ver rendimiento", command=self.mostrar_rendimiento, style="TButton")
+        self.chk_medir.grid(row=2, column=2, sticky=tk.W, padx=5)
+        self.chk_memoria.grid(row=3, column=2, sticky=tk.W, padx=5)
+        self.chk_perfilar.grid(row=4, column=2, sticky=tk.W, padx=5)
+        self.btn_rendimiento.grid(row=5, column=2, pady=5, padx=5)
+
+        # Precisión de las matrices calculadas (float32 ocupa la mitad de memoria) y exportación a archivos
+        self.matrices_float32 = tk.BooleanVar(value=True)
+        self.chk_float32 = ttk.Checkbutton(self.window, text="Matrices en float32", variable=self.matrices_float32)
+        self.btn_exportar = ttk.Button(self.window, text="Exportar resultados", command=self.exportar, style="TButton")
+        self.chk_float32.grid(row=6, column=2, sticky=tk.W, padx=5)
+        self.btn_exportar.grid(row=7, column=2, pady=5, padx=5)
+
+        # Ventanas internas para mostrar las matrices de estados (una pestaña por matriz), los datos y el
+        # reporte de rendimiento
         self.matrices_window = None
+        self.pestanas_matrices = None
         self.datos_window = None
+        self.rendimiento_window = None
+
+    def _tipo_matrices(self):
+        """
+        Tipo de punto flotante de las matrices que se calculen: float32 (por defecto, la mitad de memoria) o float64.
+        """
+        return np.float32 if self.matrices_float32.get() else np.float64
 
     def ingresar_manualmente(self):
         """
@@ -190,24 +3279,32 @@ class InterfazGrafica:
                 muestra_str = simpledialog.askstring(f"Ingresar datos manualmente", f"Ingrese la muestra {i + 1} como una cadena de {m} valores binarios:")
                 muestra = [int(bit) for bit in muestra_str]
                 muestras.append(muestra)
-            self.matrices = procesamiento_datos(n, m, muestras)
-            self.muestras_almacenadas = muestras
-            messagebox.showinfo("Éxito", "Datos ingresados correctamente.")
+            self.ejecutar_en_fondo(
+                "Calculando matrices", _calcular_muestras, muestras, m, self._tipo_matrices(),
+                al_terminar=lambda matrices: self.guardar_resultado(matrices, muestras, "Datos ingresados correctamente."),
+            )
         except ValueError:
             messagebox.showerror("Error", "Debe ingresar valores numéricos.")
 
     def generar_aleatorios(self):
         """
         Genera datos aleatorios con el número de muestras y canales especificados.
+
+        Con una semilla se generan siempre las mismas muestras; sin ella, una secuencia nueva cada vez.
+        Solo se guarda una vista previa de las muestras; al exportar se regeneran completas con la misma semilla.
         """
         try:
             n = int(self.n_entry.get())
             m = int(self.m_entry.get())
-            muestras = [np.random.randint(2, size=m) for _ in range(n)]
-            muestras = [list(muestra) + [0] * (m - len(muestra)) for muestra in muestras]
-            self.matrices = procesamiento_datos(n, m, muestras)
-            self.muestras_almacenadas = muestras  # Actualiza muestras_almacenadas con los datos generados
-            messagebox.showinfo("Éxito", "Datos aleatorios generados correctamente.")
+            texto_semilla = self.semilla_entry.get().strip()
+            # Sin semilla se elige una al azar y se conserva, para poder regenerar las muestras al exportar
+            semilla = int(texto_semilla) if texto_semilla else np.random.SeedSequence().entropy
+            self.ejecutar_en_fondo(
+                "Generando datos aleatorios", _generar_y_calcular, n, m, semilla, self._tipo_matrices(),
+                al_terminar=lambda matrices: self.guardar_resultado(
+                    matrices[:6], matrices[6], "Datos aleatorios generados correctamente.", origen=("aleatorio", n, m, semilla),
+                ),
+            )
         except ValueError:
             messagebox.showerror("Error", "Debe ingresar valores numéricos.")
 
@@ -252,201 +3349,286 @@ class InterfazGrafica:
         Muestra la matriz de datos almacenada en una ventana.
         """
         if self.muestras_almacenadas is not None:
-            df = pd.DataFrame(self.muestras_almacenadas, columns=[f'Canal {i + 1}' for i in range(len(self.muestras_almacenadas[0]))])
-            self.mostrar_dataframe(df, "Matriz de Datos")
+            self.mostrar_matriz_datos(self.muestras_almacenadas)
         else:
             messagebox.showwarning("Advertencia", "No hay datos generados.")
 
     def marginalizar_y_normalizar(self):
         """
-        Muestra la matriz EstadoFuturoBC y EstadoFuturoABC marginalizadas y normalizadas en una ventana de mensaje.
+        Muestra las matrices EstadoFuturoBC y EstadoFuturoABC marginalizadas y normalizadas, una pestaña para cada una.
+
+        EstadoFuturoBC es EstadoEstadoF marginalizada a los canales B y C (1 y 2) tanto en el presente
+        como en el futuro, de 4 x 4; EstadoFuturoABC, a los canales A, B y C (0, 1 y 2), de 8 x 8. Cada
+        fila se normaliza para que sume 1 (ver marginalizar_canales).
         """
         if self.matrices is not None:
-            EstadoFuturo_BC = self.calcular_estado_futuro_BC()
-            EstadoFuturo_ABC = self.calcular_estado_futuro_ABC()
-            resultado_BC = marginalizar_y_normalizar(EstadoFuturo_BC, [0], [1])
-            resultado_ABC = marginalizar_y_normalizar(EstadoFuturo_ABC, [0, 1], [2])
-            self.mostrar_matriz(resultado_BC, "Estado Futuro BC (Marginalizado y Normalizado)")
-            self.mostrar_matriz(resultado_ABC, "Estado Futuro ABC (Marginalizado y Normalizado)")
+            if _numero_canales(self.matrices[1].shape[0]) < 3:
+                messagebox.showerror("Error", "Se necesitan al menos 3 canales para esta marginalización.")
+                return
+
+            def mostrar(resultados):
+                resultado_BC, resultado_ABC = resultados
+                self.mostrar_matriz(resultado_BC, "Estado Futuro BC (Marginalizado y Normalizado)")
+                self.mostrar_matriz(resultado_ABC, "Estado Futuro ABC (Marginalizado y Normalizado)")
+
+            self.ejecutar_en_fondo("Marginalizando", _estados_futuros, self._red_marginales(), [[1, 2], [0, 1, 2]], al_terminar=mostrar)
         else:
             messagebox.showwarning("Advertencia", "Debe calcular las matrices primero (opción 1 o 2).")
 
+    def calcular_estado_futuro(self, canales):
+        """
+        Marginaliza EstadoEstadoF a los canales dados (en presente y futuro) y normaliza cada fila.
+        """
+        m = _numero_canales(self.matrices[1].shape[0])
+        if max(canales) >= m:
+            messagebox.showerror("Error", f"Se necesitan al menos {max(canales) + 1} canales para esta marginalización.")
+            return None
+        return self._red_marginales().marginal_normalizada(canales, canales)
+
+    def _red_marginales(self):
+        """
+        Devuelve la RedMarginales de EstadoEstadoF, que se reutiliza hasta el siguiente cálculo.
+        """
+        if self.red_marginales is None:
+            self.red_marginales = RedMarginales(self.matrices[1])
+        return self.red_marginales
+
     def calcular_estado_futuro_BC(self):
-        matriz_marginalizada = marginalizar_y_normalizar(self.matrices[1], [1, 2], [1, 2])
-        if matriz_marginalizada.shape == (2 ** 2, 2 ** 2):
-            return matriz_marginalizada / 2  # Dividimos entre 2 para ajustar según la lógica mencionada
-        else:
-            messagebox.showerror("Error", "Dimensiones incorrectas para la matriz marginalizada")
+        """
+        EstadoEstadoF marginalizada a los canales B y C (1 y 2) en presente y futuro, normalizada por filas.
+        """
+        return self.calcular_estado_futuro([1, 2])
+
     def calcular_estado_futuro_ABC(self):
-        resultado_marginalizacion = marginalizar_y_normalizar(self.matrices[1], [0, 2], [0, 2])
-        if resultado_marginalizacion.shape == (2 ** 3, 2 ** 3):
-            return resultado_marginalizacion / 2  # Dividimos entre 2 para ajustar según la lógica mencionada
-        else:
-            messagebox.showerror("Error", "Dimensiones incorrectas para la matriz marginalizada")
+        """
+        EstadoEstadoF marginalizada a los canales A, B y C (0, 1 y 2) en presente y futuro, normalizada por filas.
+        """
+        return self.calcular_estado_futuro([0, 1, 2])
 
     def cargar_csv(self):
         """
-        Permite al usuario cargar un archivo CSV con las muestras.
+        Permite al usuario cargar un archivo CSV (o binario) con las muestras.
         """
-        archivo = filedialog.askopenfilename(title="Seleccionar archivo CSV", filetypes=[("CSV files", "*.csv")])
+        archivo = filedialog.askopenfilename(
+            title="Seleccionar archivo de muestras",
+            filetypes=[("CSV files", "*.csv"), ("Muestras binarias", f"*{EXTENSION_BINARIA}"), ("Todos", "*.*")],
+        )
         if archivo:
-            try:
-                with open(archivo, newline='') as csvfile:
-                    reader = csv.reader(csvfile, delimiter=',')
-                    muestras = []
-                    for row in reader:
-                        muestra = [int(bit) for bit in row]
-                        muestras.append(muestra)
-                    n = len(muestras)
-                    m = len(muestras[0])
-                    self.matrices = procesamiento_datos(n, m, muestras)
-                    self.muestras_almacenadas = muestras
-                    messagebox.showinfo("Éxito", "Datos cargados desde CSV correctamente.")
-            except FileNotFoundError:
-                messagebox.showerror("Error", "Archivo no encontrado.")
-            except Exception as e:
-                messagebox.showerror("Error", f"Error al cargar el archivo CSV: {str(e)}")
-
-    def mostrar_matriz_ejemplo(self, titulo):
-        """
-        Muestra una matriz de ejemplo aleatoria en una ventana con el título proporcionado.
+            # Las matrices se calculan por bloques; de un CSV solo se conserva una vista previa de las
+            # muestras y al exportar se vuelve a leer el archivo completo
+            origen = None if es_binario(archivo) else ("csv", archivo)
+            self.ejecutar_en_fondo(
+                "Cargando archivo", _cargar_archivo, archivo, self._tipo_matrices(),
+                al_terminar=lambda resultado: self.guardar_resultado(*resultado, "Datos cargados correctamente.", origen=origen),
+            )
+
+    def ejecutar_en_fondo(self, descripcion, funcion, *args, al_terminar):
         """
-        matriz_ejemplo = np.random.randint(2, size=(8, 8))  # Matriz aleatoria de 0 y 1
-        self.mostrar_matriz(matriz_ejemplo, titulo)
+        Envía un cálculo al trabajador en segundo plano y muestra su avance en la ventana principal.
 
-    def mostrar_matriz(self, matriz, titulo):
+        Si ya hay un cálculo en curso se pregunta antes de cancelarlo; si no se acepta, el nuevo no se envía.
         """
-        Muestra una matriz dada en una ventana con el título proporcionado.
+        if self.trabajador.ocupado:
+            if not messagebox.askyesno("Cálculo en curso", "Hay un cálculo en curso. ¿Desea cancelarlo e iniciar este?"):
+                return
+            self.cancelar_trabajo()
+        self.estado_trabajo.set(f"{descripcion}...")
+        self.barra_progreso["value"] = 0
+        self.btn_cancelar.configure(state=tk.NORMAL)
+
+        def medir(*args, **kwargs):
+            with INSTRUMENTACION.ejecucion(descripcion):
+                return funcion(*args, **kwargs)
+
+        def terminar(resultado):
+            self.finalizar_trabajo("")
+            al_terminar(resultado)
+
+        self.trabajador.enviar(
+            medir, *args,
+            al_terminar=terminar,
+            al_fallar=self.fallo_trabajo,
+            al_avanzar=lambda fraccion: self.barra_progreso.configure(value=fraccion),
+        )
+        if not self.atendiendo_trabajos:
+            self.atendiendo_trabajos = True
+            self.window.after(100, self.atender_trabajos)
+
+    def atender_trabajos(self):
         """
-        if self.matrices_window is None or not self.matrices_window.winfo_exists():
-            self.matrices_window = tk.Toplevel(self.window)
-            self.matrices_window.title(titulo)
-            ##
-            self.matrices_window.geometry("600x400")
+        Revisa periódicamente los avisos del trabajador mientras haya un trabajo en curso.
+        """
+        if self.trabajador.atender():
+            self.window.after(100, self.atender_trabajos)
+        else:
+            self.atendiendo_trabajos = False
 
-        frame = ttk.Frame(self.matrices_window)
-        frame.grid(row=0, column=0)
+    def finalizar_trabajo(self, mensaje):
+        self.barra_progreso["value"] = 0
+        self.btn_cancelar.configure(state=tk.DISABLED)
+        self.estado_trabajo.set(mensaje)
 
-        # Crear Treeview para mostrar la matriz
-        tree = ttk.Treeview(frame)
+    def cancelar_trabajo(self):
+        """
+        Cancela el cálculo en curso; su resultado, si llega, se descarta.
+        """
+        self.trabajador.cancelar()
+        self.finalizar_trabajo("Cálculo cancelado.")
 
-        # Encabezados de columna
-        column_headers = [f'StateF {i}' for i in range(len(matriz[0]))]
-        tree["columns"] = column_headers
-        for header in column_headers:
-            tree.heading(header, text=header)
-            tree.column(header, anchor=tk.CENTER, width=50)
+    def salir(self):
+        """
+        Cancela el cálculo en curso, libera el hilo del trabajador y cierra la ventana principal.
+        """
+        self.trabajador.cerrar()
+        self.window.destroy()
 
-        if not matriz.size:
-            # Si la matriz está vacía, agregar una fila con valores vacíos
-            tree.insert("", 0, text="No hay datos", values=[""] * len(column_headers))
+    def fallo_trabajo(self, error):
+        self.finalizar_trabajo("")
+        if isinstance(error, FileNotFoundError):
+            messagebox.showerror("Error", "Archivo no encontrado.")
         else:
-            # Agregar filas
-            for i, row in enumerate(matriz):
-                tree.insert("", i, text=f'StateP {i}', values=tuple(round(val, 2) for val in row))
+            messagebox.showerror("Error", f"Error en el cálculo: {str(error)}")
 
-        tree.pack()
+    def guardar_resultado(self, matrices, muestras, mensaje, origen=None):
+        """
+        Guarda las matrices y muestras de un cálculo terminado (en el hilo de la interfaz).
 
-        # Crear tabla para mostrar la matriz
-        table = PrettyTable()
-        column_headers = [f'Future {i}' for i in range(matriz.shape[1])]
-        table.field_names = ['StatesP'] + column_headers
+        origen indica de dónde releer las muestras completas cuando muestras es solo una vista previa
+        (ver _bloques_origen); None si muestras ya las contiene todas.
+        """
+        self.matrices = matrices
+        self.muestras_almacenadas = muestras
+        self.origen_muestras = origen
+        self.red_marginales = None
+        messagebox.showinfo("Éxito", mensaje)
 
-        if not matriz.size:
-            # Si la matriz está vacía, agregar una fila con valores vacíos
-            table.add_row(["No hay datos"] + [""] * len(column_headers))
-        else:
-            for i, row in enumerate(matriz):
-                table.add_row([f'Actual {i}'] + [f'{val:.2f}' for val in row])
+    def exportar(self):
+        """
+        Exporta las matrices, las marginales BC y ABC y las muestras en el formato que indique la extensión elegida.
+        """
+        if self.matrices is None:
+            messagebox.showwarning("Advertencia", "Debe calcular las matrices primero (opción 1 o 2).")
+            return
+        ruta = filedialog.asksaveasfilename(
+            title="Exportar resultados",
+            defaultextension=".npz",
+            filetypes=[
+                ("NumPy comprimido", "*.npz"),
+                ("NumPy (carpeta con un .npy por matriz)", "*.npy"),
+                ("CSV (carpeta con un .csv.gz por matriz)", "*.csv"),
+                ("Parquet (carpeta con un .parquet por matriz)", "*.parquet"),
+            ],
+        )
+        if not ruta:
+            return
+        ruta_base, extension = os.path.splitext(ruta)
+        formato = extension.lstrip(".").lower()
+        if formato not in FORMATOS_EXPORTACION:
+            messagebox.showerror("Error", f"Extensión no soportada: {extension}")
+            return
+
+        resultados = dict(zip(NOMBRES_MATRICES, self.matrices))
+        if self.muestras_almacenadas is not None:
+            resultados["muestras"] = self.muestras_almacenadas
+        # Las matrices se exportan con la precisión con que se calcularon (ver _tipo_matrices)
+        self.ejecutar_en_fondo(
+            "Exportando", _exportar_con_marginales, ruta_base, resultados, self._red_marginales(), formato, None, self.origen_muestras,
+            al_terminar=lambda rutas: messagebox.showinfo("Éxito", f"Se exportaron {len(rutas)} archivos en {os.path.dirname(rutas[0])}."),
+        )
+
+    def configurar_instrumentacion(self):
+        """
+        Aplica las opciones de medición de rendimiento elegidas en la ventana principal.
+        """
+        INSTRUMENTACION.activa = self.medir_rendimiento.get()
+        INSTRUMENTACION.medir_memoria = self.medir_memoria.get()
+        INSTRUMENTACION.perfilador = "cprofile" if self.perfilar.get() else None
 
-        # Mostrar tabla
-        print(table)
+    def mostrar_rendimiento(self):
+        """
+        Muestra el reporte de rendimiento del último cálculo (y las vistas dibujadas después) y permite guardarlo en JSON.
+        """
+        if not INSTRUMENTACION.activa and not INSTRUMENTACION.etapas:
+            messagebox.showinfo("Rendimiento", "Active \"Medir rendimiento\" y repita el cálculo para ver el reporte.")
+            return
+        ventana = self._preparar_ventana("rendimiento_window", "Rendimiento", "700x400")
+        texto = tk.Text(ventana, wrap=tk.NONE, font=('Courier', 10))
+        texto.insert(tk.END, INSTRUMENTACION.resumen())
+        if INSTRUMENTACION.perfil:
+            texto.insert(tk.END, "\n\n" + INSTRUMENTACION.perfil)
+        texto.configure(state=tk.DISABLED)
+
+        def guardar():
+            ruta = filedialog.asksaveasfilename(title="Guardar reporte", defaultextension=".json", filetypes=[("JSON", "*.json")])
+            if ruta:
+                INSTRUMENTACION.guardar_reporte(ruta)
+
+        ttk.Button(ventana, text="Guardar reporte JSON", command=guardar, style="TButton").pack(side=tk.BOTTOM, pady=5)
+        texto.pack(fill=tk.BOTH, expand=True)
 
-    def mostrar_matriz_datos(self, muestras):
+    def mostrar_matriz_ejemplo(self, titulo):
         """
-        Muestra una matriz de datos (muestras) en una ventana.
+        Muestra una matriz de ejemplo aleatoria en una ventana con el título proporcionado.
         """
-        if self.datos_window is None or not self.datos_window.winfo_exists():
-            self.datos_window = tk.Toplevel(self.window)
-            self.datos_window.title("Matriz de Datos")
-            ####
-            self.datos_window.geometry("600x400")
+        matriz_ejemplo = np.random.randint(2, size=(8, 8))  # Matriz aleatoria de 0 y 1
+        self.mostrar_matriz(matriz_ejemplo, titulo)
 
-        frame = ttk.Frame(self.datos_window)
-        frame.grid(row=0, column=0)
+    def _preparar_ventana(self, atributo, titulo, geometria):
+        """
+        Reutiliza (vaciándola) o crea la ventana interna guardada en el atributo dado.
+        """
+        ventana = getattr(self, atributo)
+        if ventana is None or not ventana.winfo_exists():
+            ventana = tk.Toplevel(self.window)
+            ventana.geometry(geometria)
+            setattr(self, atributo, ventana)
+        for hijo in ventana.winfo_children():
+            hijo.destroy()
+        ventana.title(titulo)
+        return ventana
+
+    def _pestana_matriz(self, titulo):
+        """
+        Crea en la ventana de matrices una pestaña con el título dado y la selecciona.
 
-        # Crear Treeview para mostrar las muestras
-        tree = ttk.Treeview(frame)
-        
+        Si ya había una pestaña con ese título se reemplaza; las demás se conservan, de modo que varias
+        matrices (por ejemplo EstadoFuturoBC y EstadoFuturoABC) quedan a la vista a la vez.
+        """
+        if self.matrices_window is None or not self.matrices_window.winfo_exists():
+            self.matrices_window = tk.Toplevel(self.window)
+            self.matrices_window.geometry("600x400")
+            self.matrices_window.title("Matrices")
+            self.pestanas_matrices = ttk.Notebook(self.matrices_window)
+            self.pestanas_matrices.pack(fill=tk.BOTH, expand=True)
+        for pestana in self.pestanas_matrices.tabs():
+            if self.pestanas_matrices.tab(pestana, "text") == titulo:
+                self.pestanas_matrices.nametowidget(pestana).destroy()
+        marco = ttk.Frame(self.pestanas_matrices)
+        self.pestanas_matrices.add(marco, text=titulo)
+        self.pestanas_matrices.select(marco)
+        return marco
 
-        # Encabezados de columna
-        if muestras:
-            column_headers = [f'Canal {i + 1}' for i in range(len(muestras[0]))]
-        else:
-            column_headers = ["No hay datos"]
-        tree["columns"] = column_headers
-        for col in column_headers:
-            tree.heading(col, text=col)
-        
-
-        if not muestras:
-            # Si la lista de muestras está vacía, agregar una fila con valores vacíos
-            tree.insert("", 0, text="No hay datos", values=[""] * len(column_headers))
-        else:
-            # Agregar filas
-            for i, row in enumerate(muestras):
-                tree.insert("", i, text=f'Muestra {i + 1}', values=tuple(row))
-        tree.pack()
-
-        
-        # Crear tabla para mostrar las muestras
-        table = PrettyTable()
-        if muestras:
-            column_headers = [f'Canal {i + 1}' for i in range(len(muestras[0]))]
-        else:
-            column_headers = ["No hay datos"]
-        table.field_names = ['Muestra'] + column_headers
+    def mostrar_matriz(self, matriz, titulo):
+        """
+        Muestra una matriz dada en una pestaña de la ventana de matrices con el título proporcionado.
 
-        if not muestras:
-            # Si la lista de muestras está vacía, agregar una fila con valores vacíos
-            table.add_row(["No hay datos"] + [""] * len(column_headers))
-        else:
-            for i, row in enumerate(muestras):
-                table.add_row([f'Muestra {i + 1}'] + [str(val) for val in row])
+        Solo se dibujan las celdas visibles; la tabla completa se imprime en consola bajo pedido.
+        """
+        VisorPaginado(self._pestana_matriz(titulo), matriz, lambda i: f'StateP {i}', lambda j: f'StateF {j}')
 
-        # Mostrar tabla
-        print(table)
+    def mostrar_matriz_datos(self, muestras):
+        """
+        Muestra una matriz de datos (muestras) en una ventana.
+        """
+        ventana = self._preparar_ventana("datos_window", "Matriz de Datos", "600x400")
+        VisorPaginado(ventana, muestras if muestras is not None else [], lambda i: f'Muestra {i + 1}', lambda j: f'Canal {j + 1}', None)
 
     def mostrar_dataframe(self, df, titulo):
         """
         Muestra un DataFrame en una ventana interna.
         """
-        if self.datos_window is None or not self.datos_window.winfo_exists():
-            self.datos_window = tk.Toplevel(self.window)
-            self.datos_window.title(titulo)
-            ###
-            self.datos_window.geometry("800x400")
-            
-
-        frame = ttk.Frame(self.datos_window)
-        frame.grid(row=0, column=0)
-
-        # Crear Treeview para mostrar el DataFrame
-        tree = ttk.Treeview(frame)
-
-        # Encabezados de columna
-        column_headers = list(df.columns)
-        tree["columns"] = column_headers
-        for header in column_headers:
-            tree.heading(header, text=header)
-            tree.column(header, anchor=tk.CENTER, width=60)
-
-        # Agregar filas
-        for i, (_, row) in enumerate(df.iterrows()):
-            tree.insert("", i, text=f'Row {i}', values=tuple(row))
-
-        tree.pack()
-        # Ajuste del ancho de las columnas
+        ventana = self._preparar_ventana("datos_window", titulo, "800x400")
+        VisorPaginado(ventana, df, lambda i: f'Row {i}', lambda j: str(df.columns[j]), None)
 
     def run(self):
         """
@@ -455,5 +3637,4 @@ class InterfazGrafica:
         self.window.mainloop()
 
 if __name__ == "__main__":
-    interfaz = InterfazGrafica()
-    interfaz.run()
\ No newline at end of file
+    main()
@@ -0,0 +1,303 @@
+# Pruebas de la lógica de combinación y de fronteras entre bloques, contra la implementación de referencia
+import os
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+
+from benchmark_matrices import cargar_modulo, generar_muestras
+
+modulo = cargar_modulo()
+
+def densa(matriz):
+    return matriz.toarray() if isinstance(matriz, modulo.MatrizDispersa) else np.asarray(matriz)
+
+def conteos_retardo(estados, m, retardo):
+    """
+    Conteos de las transiciones con retardo dado, muestra a muestra.
+    """
+    conteos = np.zeros((2 ** m, 2 ** m), dtype=np.int64)
+    for origen, destino in zip(estados[:-retardo], estados[retardo:]):
+        conteos[origen, destino] += 1
+    return conteos
+
+class PruebaMatrices(unittest.TestCase):
+
+    def setUp(self):
+        self.directorio = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directorio.cleanup()
+
+    def ruta(self, nombre):
+        return os.path.join(self.directorio.name, nombre)
+
+    def guardar_csv(self, nombre, muestras):
+        ruta = self.ruta(nombre)
+        np.savetxt(ruta, muestras, fmt="%d", delimiter=",")
+        return ruta
+
+    def assertMatricesIguales(self, esperadas, obtenidas):
+        for nombre, esperada, obtenida in zip(modulo.NOMBRES_MATRICES, esperadas, obtenidas):
+            np.testing.assert_allclose(densa(obtenida), esperada, rtol=0, atol=1e-12, err_msg=nombre)
+
+    def test_combinar_partes_contiguas(self):
+        n, m = 301, 4
+        muestras = generar_muestras(n, m, 1)
+        referencia = modulo.procesamiento_datos_referencia(n, m, muestras.tolist())[:6]
+        for dispersa in (False, True):
+            for cortes in ([1], [150], [299, 300], [2, 3, 4, 100, 250]):
+                total = modulo.ModeloTransiciones(m, dispersa)
+                for parte in np.split(muestras, cortes):
+                    total.combinar(modulo.ModeloTransiciones(m, dispersa).actualizar(parte), contiguo=True)
+                self.assertEqual(total.n, n)
+                self.assertMatricesIguales(referencia, total.matrices())
+
+    def test_combinar_grabaciones_independientes(self):
+        m = 3
+        primera, segunda = generar_muestras(120, m, 2), generar_muestras(80, m, 3)
+        total = modulo.ModeloTransiciones(m).actualizar(primera).combinar(modulo.ModeloTransiciones(m).actualizar(segunda))
+
+        # Sin enlace, EstadoEstadoP no tiene la transición de la última muestra de una a la primera de la otra
+        conteos = total.conteos()
+        esperado = modulo.ModeloTransiciones(m).actualizar(primera).conteos()['EstadoEstadoP'].astype(np.int64)
+        esperado += modulo.ModeloTransiciones(m).actualizar(segunda).conteos()['EstadoEstadoP']
+        np.testing.assert_array_equal(conteos['EstadoEstadoP'], esperado)
+        self.assertEqual(total.n, 200)
+
+    def test_csv_por_rangos_de_bytes(self):
+        n, m = 257, 5
+        muestras = generar_muestras(n, m, 4)
+        ruta = self.guardar_csv("muestras.csv", muestras)
+        referencia = modulo.procesamiento_datos_referencia(n, m, muestras.tolist())[:6]
+        tam = os.path.getsize(ruta)
+        for cortes in ([tam // 2], [1, 2, 3], [10, 11, 12, 13, tam - 1], list(range(0, tam, 37))):
+            limites = [0] + cortes + [tam]
+            filas = [modulo.leer_csv_por_bloques(ruta, 16, inicio, fin) for inicio, fin in zip(limites, limites[1:])]
+            leidas = np.concatenate([bloque for parte in filas for bloque in parte])
+            np.testing.assert_array_equal(leidas, muestras)
+
+            total = modulo.ModeloTransiciones(m)
+            for k, (inicio, fin) in enumerate(zip(limites, limites[1:])):
+                parte = modulo.ModeloTransiciones(m)
+                for estados in modulo.leer_estados_por_bloques(ruta, 16, inicio, fin):
+                    parte.actualizar_estados(estados)
+                total.combinar(parte, contiguo=k > 0)
+            self.assertMatricesIguales(referencia, total.matrices())
+
+    def test_binario_por_rangos_de_bytes(self):
+        n, m = 203, 10
+        muestras = generar_muestras(n, m, 5)
+        ruta = self.ruta("muestras" + modulo.EXTENSION_BINARIA)
+        modulo.guardar_binario(ruta, muestras)
+        estados = modulo.codificar_estados(muestras, m)
+        tam = os.path.getsize(ruta)
+        for cortes in ([tam // 2], [modulo.CABECERA_BINARIA.size + 1], list(range(3, tam, 29))):
+            limites = [0] + cortes + [tam]
+            leidos = [
+                bloque for inicio, fin in zip(limites, limites[1:])
+                for bloque in modulo.leer_estados_por_bloques(ruta, 16, inicio, fin)
+            ]
+            np.testing.assert_array_equal(np.concatenate(leidos), estados)
+
+    def test_procesar_en_paralelo(self):
+        m = 4
+        grabaciones = [generar_muestras(n, m, 10 + n) for n in (1, 2, 400, 37)]
+        for k, muestras in enumerate(grabaciones):
+            self.guardar_csv(f"grabacion{k}.csv", muestras)
+        modulo.guardar_binario(self.ruta("grabacion9" + modulo.EXTENSION_BINARIA), grabaciones[2])
+        grabaciones.append(grabaciones[2])
+
+        tam_min_parte = modulo.TAM_MIN_PARTE
+        modulo.TAM_MIN_PARTE = 64  # Varias partes por archivo
+        try:
+            for dispersa in (False, True):
+                esperado = modulo.ModeloTransiciones(m, dispersa)
+                for muestras in grabaciones:
+                    esperado.combinar(modulo.ModeloTransiciones(m, dispersa).actualizar(muestras))
+                for procesos in (1, 3):
+                    total = modulo.procesar_en_paralelo([self.directorio.name], procesos, dispersa)
+                    self.assertEqual(total.n, esperado.n)
+                    self.assertMatricesIguales([densa(matriz) for matriz in esperado.matrices()], total.matrices())
+        finally:
+            modulo.TAM_MIN_PARTE = tam_min_parte
+
+    def test_binario_rechaza_valores_no_binarios(self):
+        ruta = self.ruta("muestras" + modulo.EXTENSION_BINARIA)
+        for muestras in ([[0, 1], [2, 0]], [[0, 1], [-1, 0]], np.array([[1, 0], [0, 255]], dtype=np.uint8)):
+            with self.assertRaisesRegex(ValueError, "0 y 1"):
+                modulo.guardar_binario(ruta, muestras)
+        with self.assertRaisesRegex(ValueError, "0 y 1"):
+            modulo.convertir_csv_a_binario(self.guardar_csv("muestras.csv", [[0, 1], [1, 3]]), ruta)
+
+    def test_exportar_muestras_empaquetadas(self):
+        muestras = generar_muestras(1000, 11, 9)
+        ruta = self.ruta("muestras" + modulo.EXTENSION_BINARIA)
+        modulo.guardar_binario(ruta, muestras)
+        empaquetadas = modulo.cargar_binario(ruta)
+
+        modulo.exportar_resultados(self.ruta("npz"), {"muestras": empaquetadas}, "npz")
+        with np.load(self.ruta("npz.npz")) as datos:
+            bits = np.unpackbits(datos["muestras_empaquetadas"], axis=1, count=int(datos["muestras_canales"]))
+        np.testing.assert_array_equal(bits, muestras)
+
+        modulo.exportar_resultados(self.ruta("npy"), {"muestras": empaquetadas}, "npy")
+        np.testing.assert_array_equal(np.load(os.path.join(self.ruta("npy"), "muestras.npy")), muestras)
+
+    def test_exportar_muestras_completas_desde_el_origen(self):
+        n, m, semilla = 2500, 4, 11
+        muestras = generar_muestras(n, m, 10)
+        generadas = np.concatenate(list(modulo._bloques_origen(("aleatorio", n, m, semilla))))
+        for origen, esperadas in ((("csv", self.guardar_csv("muestras.csv", muestras)), muestras), (("aleatorio", n, m, semilla), generadas)):
+            ruta_base = self.ruta(origen[0])
+            red = modulo.RedMarginales(modulo.procesamiento_datos(n, m, esperadas)[1])
+            # La vista previa que guarda la interfaz se reemplaza por las muestras completas
+            resultados = {"muestras": esperadas[:modulo.MAX_MUESTRAS_VISTA]}
+            modulo._exportar_con_marginales(ruta_base, resultados, red, "npy", None, origen)
+            np.testing.assert_array_equal(np.load(os.path.join(ruta_base, "muestras.npy")), esperadas)
+        self.assertEqual(len(generadas), n)
+        self.assertEqual(sorted(os.listdir(self.directorio.name)), ["aleatorio", "csv", "muestras.csv"])
+
+    def test_retardos_entre_bloques(self):
+        n, m, max_retardo = 150, 3, 5
+        muestras = generar_muestras(n, m, 6)
+        estados = modulo.codificar_estados(muestras, m)
+        for dispersa in (False, True):
+            for tam_bloque in (1, 2, 4, 7, n):
+                retardos = modulo.ModeloRetardos(m, max_retardo, dispersa)
+                for inicio in range(0, n, tam_bloque):
+                    retardos.actualizar(muestras[inicio:inicio + tam_bloque])
+                for retardo in range(1, max_retardo + 1):
+                    np.testing.assert_array_equal(densa(retardos.conteos(retardo)), conteos_retardo(estados, m, retardo))
+
+        # Con retardo 1 son los mismos conteos que EstadoEstadoP
+        transiciones = modulo.ModeloTransiciones(m).actualizar(muestras)
+        np.testing.assert_array_equal(densa(retardos.conteos(1)), densa(transiciones.conteos()['EstadoEstadoP']))
+
+    def test_cerrar_trabajador_cancela_el_trabajo(self):
+        def esperar(progreso=None, cancelado=None):
+            for _ in modulo._seguir_bloques(iter(lambda: [0], None), 0, cancelado=cancelado):
+                cancelado.wait(0.01)
+
+        trabajador = modulo.TrabajadorFondo()
+        trabajador.enviar(esperar)
+        trabajador.enviar(esperar)  # Queda en cola detrás del primero
+        trabajador.cerrar()
+        self.assertFalse(trabajador.ocupado)
+        for hilo in trabajador._ejecutor._threads:
+            hilo.join(5)
+            self.assertFalse(hilo.is_alive())
+
+    def test_progreso_red_marginales(self):
+        matriz = modulo.procesamiento_datos(200, 3, generar_muestras(200, 3, 8))[1]
+        familia = list(modulo.familia_subconjuntos(3))
+        avances = []
+        modulo.RedMarginales(matriz).calcular(familia, progreso=avances.append)
+        self.assertEqual(len(avances), len(familia))
+        np.testing.assert_allclose(avances, np.arange(1, len(familia) + 1) / len(familia))
+
+    def test_predictor_pasos(self):
+        matriz = modulo.ModeloRetardos(3, 1).actualizar(generar_muestras(500, 3, 7)).matriz(1)
+        predictor = modulo.PredictorPasos(matriz)
+        np.testing.assert_allclose(predictor.potencia(np.int64(5)), np.linalg.matrix_power(matriz, 5))
+        np.testing.assert_allclose(predictor.predecir(2, np.int64(3)), np.linalg.matrix_power(matriz, 3)[2])
+        with self.assertRaises(ValueError):
+            predictor.predecir(2, -1)
+        with self.assertRaises(TypeError):
+            predictor.potencia(2.5)
+
+    def test_generacion_aleatoria_reproducible(self):
+        # La interfaz y el modo por lotes (--aleatorio) generan las mismas muestras con la misma semilla
+        n, m = 3000, 5
+        interfaz = modulo._generar_y_calcular(n, m, 11)
+        lotes = modulo.modelo_aleatorio(n, m, 11).matrices()
+        self.assertMatricesIguales(lotes, interfaz[:6])
+        estados = next(modulo.generar_bloques_aleatorios(n, m, 11, estados=True))
+        np.testing.assert_array_equal(modulo.codificar_estados(interfaz[6], m), estados[:modulo.MAX_MUESTRAS_VISTA])
+
+class PruebaCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directorio = tempfile.TemporaryDirectory()
+        self.cache = modulo.CacheResultados(os.path.join(self.directorio.name, "cache"))
+        self.muestras = generar_muestras(300, 4, 20)
+        self.ruta = os.path.join(self.directorio.name, "muestras.csv")
+        np.savetxt(self.ruta, self.muestras, fmt="%d", delimiter=",")
+        self.referencia = modulo.procesamiento_datos_referencia(300, 4, self.muestras.tolist())[:6]
+
+    def tearDown(self):
+        self.directorio.cleanup()
+
+    def resultados(self):
+        return sorted(nombre for nombre in os.listdir(self.cache.directorio) if nombre.endswith(".npz"))
+
+    def assertMatricesReferencia(self, matrices):
+        for esperada, obtenida in zip(self.referencia, matrices):
+            np.testing.assert_allclose(densa(obtenida), esperada, rtol=0, atol=1e-12)
+
+    def test_acierto_por_opciones(self):
+        densas = modulo.procesar_archivo_con_cache(self.ruta, self.cache)
+        dispersas = modulo.procesar_archivo_con_cache(self.ruta, self.cache, dispersa=True)
+        simples = modulo.procesar_archivo_con_cache(self.ruta, self.cache, tipo=np.float32)
+        self.assertEqual(len(self.resultados()), 3)
+        self.assertMatricesReferencia(densas[:6])
+        self.assertMatricesReferencia(dispersas[:6])
+        for esperada, obtenida in zip(self.referencia, simples[:6]):
+            self.assertEqual(obtenida.dtype, np.float32)
+            np.testing.assert_allclose(obtenida, esperada, rtol=1e-6)
+
+        with mock.patch.object(modulo, "modelo_desde_archivo", side_effect=AssertionError("no debe recalcular")):
+            self.assertIsInstance(modulo.procesar_archivo_con_cache(self.ruta, self.cache, dispersa=True)[1], modulo.MatrizDispersa)
+            self.assertIsInstance(modulo.procesar_archivo_con_cache(self.ruta, self.cache)[1], np.ndarray)
+            self.assertEqual(modulo.procesar_archivo_con_cache(self.ruta, self.cache, tipo=np.float32)[1].dtype, np.float32)
+
+    def test_expulsion_lru(self):
+        matrices = modulo.ModeloTransiciones(4).actualizar(self.muestras).matrices()
+        for clave, segundos in (("a", 1), ("b", 3), ("c", 2)):
+            self.cache.guardar(clave, matrices)
+            os.utime(self.cache._ruta(clave), (segundos, segundos))
+        self.assertIsNotNone(self.cache.obtener("a"))  # "a" pasa a ser el más reciente
+        self.cache.max_bytes = 2 * os.path.getsize(self.cache._ruta("a"))
+        self.cache._expulsar()
+        self.assertEqual(self.resultados(), ["a.npz", "b.npz"])
+
+    def test_poda_del_indice(self):
+        modulo.procesar_archivo_con_cache(self.ruta, self.cache)
+        otra = os.path.join(self.directorio.name, "otra.csv")
+        np.savetxt(otra, self.muestras[:100], fmt="%d", delimiter=",")
+        modulo.procesar_archivo_con_cache(otra, self.cache)
+        self.assertEqual(len(self.cache._leer_indice()), 2)
+
+        # Una nueva versión del archivo reemplaza la firma anterior de la misma ruta
+        np.savetxt(self.ruta, self.muestras[::-1], fmt="%d", delimiter=",")
+        os.utime(self.ruta, (10, 10))
+        modulo.procesar_archivo_con_cache(self.ruta, self.cache)
+        self.assertEqual(len(self.cache._leer_indice()), 2)
+
+        # Las firmas de archivos borrados y de resultados expulsados se quitan al expulsar
+        os.remove(otra)
+        self.cache._expulsar()
+        self.assertEqual([firma.rsplit("|", 2)[0] for firma in self.cache._leer_indice()], [os.path.abspath(self.ruta)])
+        self.cache.max_bytes = 0
+        self.cache._expulsar()
+        self.assertEqual(self.cache._leer_indice(), {})
+
+    def test_entrada_danada(self):
+        modulo.procesar_archivo_con_cache(self.ruta, self.cache)
+        ruta_resultado = os.path.join(self.cache.directorio, self.resultados()[0])
+        with open(ruta_resultado, "r+b") as archivo:
+            archivo.truncate(os.path.getsize(ruta_resultado) // 2)
+        self.assertMatricesReferencia(modulo.procesar_archivo_con_cache(self.ruta, self.cache)[:6])
+        self.assertIsNotNone(self.cache.obtener(self.resultados()[0][:-len(".npz")]))
+
+    def test_cache_no_disponible(self):
+        with mock.patch.object(modulo, "CacheResultados", side_effect=PermissionError("solo lectura")):
+            self.assertMatricesReferencia(modulo.procesar_archivo_con_cache(self.ruta)[:6])
+        with mock.patch.object(self.cache, "guardar", side_effect=OSError(28, "disco lleno")):
+            self.assertMatricesReferencia(modulo.procesar_archivo_con_cache(self.ruta, self.cache)[:6])
+        with mock.patch.object(modulo.np, "savez_compressed", side_effect=OSError(28, "disco lleno")):
+            self.assertMatricesReferencia(modulo.procesar_archivo_con_cache(self.ruta, self.cache)[:6])
+        self.assertEqual(self.resultados(), [])
+
+if __name__ == "__main__":
+    unittest.main()